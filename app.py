@@ -5,13 +5,27 @@ import secrets
 import qrcode
 from io import BytesIO
 import base64
+import csv
 import json
+import io
+import time
+import click
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, abort
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, abort, make_response
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
 from sqlalchemy.orm import DeclarativeBase
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
 import jwt
+from hashing import PasswordHasher, HashingBusy
+from status import SlotStatusCounter
+from ratelimit import RateLimiter
+from fragments import FragmentCache
+from reservations import ReservationIndex, book_slot, claim_reservation, pick_walk_in_slot, parse_utc
+from events import EventLog, ENTRY, EXIT, BILL, benchmark_rebuild, occupancy_counts
+from capture import TrafficCapture
+import storage
+from idempotency import IdempotencyStore, ClaimLost, REPLAY, IN_PROGRESS, MISMATCH
 from functools import wraps
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -32,28 +46,134 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///database.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+app.config["STORAGE_PROFILE"] = os.environ.get("STORAGE_PROFILE") or storage.detect_profile(app.config["SQLALCHEMY_DATABASE_URI"])
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = storage.engine_options(app.config["STORAGE_PROFILE"], {
+    key: int(os.environ[env]) for key, env in [
+        ("pool_size", "DB_POOL_SIZE"),
+        ("max_overflow", "DB_MAX_OVERFLOW"),
+        ("statement_timeout_ms", "DB_STATEMENT_TIMEOUT_MS"),
+    ] if env in os.environ
+})
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Configure password hashing (runs in a separate process pool)
+app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+app.config["PASSWORD_HASH_PER_CLIENT"] = int(os.environ.get("PASSWORD_HASH_PER_CLIENT", 2))
+
+password_hasher = PasswordHasher(
+    method=app.config["PASSWORD_HASH_METHOD"],
+    max_workers=app.config["PASSWORD_HASH_WORKERS"],
+    max_pending=app.config["PASSWORD_HASH_WORKERS"] * 8,
+    per_client_limit=app.config["PASSWORD_HASH_PER_CLIENT"],
+)
+
+# Configure public status API micro-cache
+app.config["STATUS_CACHE_SECONDS"] = float(os.environ.get("STATUS_CACHE_SECONDS", 2))
+
+slot_status = SlotStatusCounter(ttl=app.config["STATUS_CACHE_SECONDS"])
+
+# Configure rate limits (token buckets shared by all workers through a local SQLite file)
+app.config["RATE_LIMIT_DB"] = os.environ.get("RATE_LIMIT_DB", os.path.join(app.instance_path, "ratelimit.db"))
+app.config["RATE_LIMIT_BILL_PER_MINUTE"] = int(os.environ.get("RATE_LIMIT_BILL_PER_MINUTE", 20))
+app.config["RATE_LIMIT_QR_PER_MINUTE"] = int(os.environ.get("RATE_LIMIT_QR_PER_MINUTE", 10))
+# Per-address limits are shared by every car behind the lot Wi-Fi or carrier NAT,
+# so they only cap floods from one address and sit well above the per-user ones
+app.config["RATE_LIMIT_BILL_IP_PER_MINUTE"] = int(os.environ.get("RATE_LIMIT_BILL_IP_PER_MINUTE", 200))
+app.config["RATE_LIMIT_QR_IP_PER_MINUTE"] = int(os.environ.get("RATE_LIMIT_QR_IP_PER_MINUTE", 100))
+
+os.makedirs(os.path.dirname(os.path.abspath(app.config["RATE_LIMIT_DB"])), exist_ok=True)
+rate_limiter = RateLimiter(app.config["RATE_LIMIT_DB"], limits={
+    'bill': (app.config["RATE_LIMIT_BILL_PER_MINUTE"], app.config["RATE_LIMIT_BILL_PER_MINUTE"] / 60),
+    'qr': (app.config["RATE_LIMIT_QR_PER_MINUTE"], app.config["RATE_LIMIT_QR_PER_MINUTE"] / 60),
+    'bill_ip': (app.config["RATE_LIMIT_BILL_IP_PER_MINUTE"], app.config["RATE_LIMIT_BILL_IP_PER_MINUTE"] / 60),
+    'qr_ip': (app.config["RATE_LIMIT_QR_IP_PER_MINUTE"], app.config["RATE_LIMIT_QR_IP_PER_MINUTE"] / 60),
+})
+
+# Configure template fragment cache (versions shared by all workers through a local SQLite file)
+app.config["FRAGMENT_CACHE_DB"] = os.environ.get("FRAGMENT_CACHE_DB", os.path.join(app.instance_path, "fragments.db"))
+app.config["FRAGMENT_CACHE_SIZE"] = int(os.environ.get("FRAGMENT_CACHE_SIZE", 256))
+app.config["FRAGMENT_CACHE_USER_SIZE"] = int(os.environ.get("FRAGMENT_CACHE_USER_SIZE", 1024))
+
+os.makedirs(os.path.dirname(os.path.abspath(app.config["FRAGMENT_CACHE_DB"])), exist_ok=True)
+fragment_cache = FragmentCache(app.config["FRAGMENT_CACHE_DB"], maxsize=app.config["FRAGMENT_CACHE_SIZE"],
+                               user_maxsize=app.config["FRAGMENT_CACHE_USER_SIZE"])
+
+# Configure advance reservations
+app.config["RESERVATION_GRACE_MINUTES"] = int(os.environ.get("RESERVATION_GRACE_MINUTES", 15))
+app.config["RESERVATION_HORIZON_MINUTES"] = int(os.environ.get("RESERVATION_HORIZON_MINUTES", 120))
+
+reservation_index = ReservationIndex()
+
+# Configure gate event log (segment files and snapshots)
+app.config["EVENT_LOG_DIR"] = os.environ.get("EVENT_LOG_DIR", os.path.join(app.instance_path, "events"))
+app.config["EVENT_LOG_SNAPSHOT_EVERY"] = int(os.environ.get("EVENT_LOG_SNAPSHOT_EVERY", 100000))
+
+event_log = EventLog(app.config["EVENT_LOG_DIR"], snapshot_every=app.config["EVENT_LOG_SNAPSHOT_EVERY"])
+event_log.init_session(db.session)
+
+# Configure idempotency keys for retried money- and slot-changing requests
+app.config["IDEMPOTENCY_TTL_HOURS"] = int(os.environ.get("IDEMPOTENCY_TTL_HOURS", 24))
+app.config["IDEMPOTENCY_LEASE_SECONDS"] = int(os.environ.get("IDEMPOTENCY_LEASE_SECONDS", 30))
+
+idempotency_store = IdempotencyStore(
+    ttl=timedelta(hours=app.config["IDEMPOTENCY_TTL_HOURS"]),
+    lease=timedelta(seconds=app.config["IDEMPOTENCY_LEASE_SECONDS"]),
+)
+
+# Configure bulk fleet onboarding
+app.config["FLEET_BATCH_SIZE"] = int(os.environ.get("FLEET_BATCH_SIZE", 500))
+app.config["FLEET_HASH_WORKERS"] = int(os.environ.get("FLEET_HASH_WORKERS", os.cpu_count() or 2))
+# Uploads are hashed inside the request, so keep them to what a few processes
+# finish well within a request timeout (scrypt: about 10 hashes/s per process)
+app.config["FLEET_UPLOAD_MAX_ROWS"] = int(os.environ.get("FLEET_UPLOAD_MAX_ROWS", 200))
+app.config["FLEET_UPLOAD_HASH_WORKERS"] = int(os.environ.get("FLEET_UPLOAD_HASH_WORKERS", 2))
+
+# Configure data retention (see retention.py)
+app.config["RETENTION_QR_DAYS"] = int(os.environ.get("RETENTION_QR_DAYS", 30))
+app.config["RETENTION_TRANSACTION_DAYS"] = int(os.environ.get("RETENTION_TRANSACTION_DAYS", 365))
+app.config["RETENTION_BATCH_SIZE"] = int(os.environ.get("RETENTION_BATCH_SIZE", 1000))
+app.config["RETENTION_MODE"] = os.environ.get("RETENTION_MODE", "table")
+app.config["RETENTION_ARCHIVE_DIR"] = os.environ.get("RETENTION_ARCHIVE_DIR", "archive")
+
+# Configure opt-in traffic capture (replay with replay.py)
+app.config["TRAFFIC_CAPTURE_DIR"] = os.environ.get("TRAFFIC_CAPTURE_DIR")
+
+if app.config["TRAFFIC_CAPTURE_DIR"]:
+    app.wsgi_app = TrafficCapture(
+        app.wsgi_app, app.url_map, app.config["TRAFFIC_CAPTURE_DIR"],
+        salt=os.environ.get("TRAFFIC_CAPTURE_SALT", app.secret_key),
+        max_bytes=int(os.environ.get("TRAFFIC_CAPTURE_MAX_BYTES", 50 * 1024 * 1024))
+    )
+
 # Initialize app with SQLAlchemy
 db.init_app(app)
 
 # Import models after db initialization
 with app.app_context():
-    from models import User, ParkingSlot, Transaction, QRCode, Bill
+    storage.configure_engine(db.engine, app.config["STORAGE_PROFILE"])
+    
+    from models import User, ParkingSlot, Transaction, QRCode, Bill, QRCodeArchive, TransactionArchive, Reservation, GateEvent, IdempotencyKey
+    
+    from slots import create_slot_range, set_range_status, set_zone_maintenance
     
     # Create all tables
     db.create_all()
     
+    # Add columns introduced after the table was first created
+    if 'zone' not in [column['name'] for column in inspect(db.engine).get_columns('parking_slot')]:
+        db.session.execute(text('ALTER TABLE parking_slot ADD COLUMN zone VARCHAR(20)'))
+        db.session.commit()
+    
+    # create_all skips indexes on tables that already exist
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    
     # Check if we need to pre-populate database with initial data
     if ParkingSlot.query.count() == 0:
         # Create 50 parking slots
-        for i in range(1, 51):
-            slot = ParkingSlot(slot_number=i, status="Available")
-            db.session.add(slot)
+        create_slot_range(db.session, 1, 50, event_log=event_log)
         
         # Add sample bills for testing
         sample_bills = [
@@ -79,6 +199,15 @@ with app.app_context():
         
         db.session.commit()
         logging.debug("Database initialized with sample data")
+    
+    # Seed slot counts from the event log (latest snapshot plus the tail). The
+    # log only knows slots that have events, so use it only when it covers all
+    # of them; the counter re-reads the database after its ttl either way.
+    event_log.bind(db.engine)
+    seq, occupancy = event_log.rebuild()
+    if occupancy and len(occupancy) == ParkingSlot.query.count():
+        slot_status.seed(occupancy_counts(occupancy))
+    logging.debug(f"Rebuilt occupancy of {len(occupancy)} slots from the event log up to event {seq}")
 
 # JWT token required decorator
 def token_required(f):
@@ -103,6 +232,10 @@ def token_required(f):
             if not current_user:
                 flash('User not found.', 'danger')
                 return redirect(url_for('login'))
+            
+            # Lets traffic capture attribute the request without decoding the session
+            request.environ['parkease.user_id'] = current_user.id
+            request.environ['parkease.is_admin'] = current_user.is_admin
         except Exception as e:
             logging.error(f"Token error: {str(e)}")
             flash('Session expired. Please login again.', 'danger')
@@ -124,6 +257,122 @@ def admin_required(f):
     
     return decorated
 
+# Rate limit decorator (use below token_required), charges the user and then, only if the
+# user is within their limit, the client address (scope '<scope>_ip')
+def rate_limited(scope):
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            retry_after = rate_limiter.hit((scope, f'user:{current_user.id}'),
+                                           (f'{scope}_ip', f'ip:{request.remote_addr}'))
+            if retry_after:
+                response = jsonify({'success': False, 'message': 'Too many requests. Please try again shortly.'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(int(retry_after) + 1)
+                return response
+            return f(current_user, *args, **kwargs)
+        
+        return decorated
+    
+    return decorator
+
+# Idempotency decorator (use below token_required and above rate_limited). Clients send
+# an Idempotency-Key header, or an idempotency_key form field for plain HTML forms,
+# and get the first response back when they retry.
+def idempotent(f):
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        client_key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+        if not client_key:
+            return f(current_user, *args, **kwargs)
+        if len(client_key) > 255:
+            return jsonify({'success': False, 'message': 'Idempotency key is too long.'}), 400
+        
+        key = idempotency_store.key_for(current_user.id, request.endpoint, client_key)
+        fingerprint = idempotency_store.fingerprint(request.path, [
+            (name, value) for name, value in request.form.items(multi=True) if name != 'idempotency_key'
+        ])
+        
+        state, stored = idempotency_store.begin(db.engine, key, fingerprint)
+        if state == MISMATCH:
+            return jsonify({'success': False, 'message': 'Idempotency key was already used for a different request.'}), 422
+        if state == IN_PROGRESS:
+            return in_progress_response()
+        if state == REPLAY:
+            response = make_response(stored.body, stored.status_code)
+            response.content_type = stored.content_type
+            if stored.location:
+                response.headers['Location'] = stored.location
+                flash('This request was already processed.', 'info')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        # Committed together with the route's work (see mark_idempotency_key_done), so a
+        # retry after the worker dies between that commit and complete() still replays
+        if request.headers.get('Idempotency-Key'):
+            stand_in = jsonify({'success': True, 'message': 'This request was already processed.'})
+        else:
+            stand_in = redirect(request.referrer or url_for('dashboard'))
+        db.session.info['committed'] = False
+        db.session.info['idempotency_claim'] = (key, stored, stand_in)
+        try:
+            response = make_response(f(current_user, *args, **kwargs))
+        except ClaimLost:
+            # Our lease ran out and another request owns the key; this one's work was rolled back
+            db.session.rollback()
+            return in_progress_response()
+        except Exception as e:
+            committed = db.session.info['committed']
+            db.session.rollback()
+            db.session.info.pop('idempotency_claim', None)
+            claim = db.session.info.pop('idempotency_token', stored)
+            if not committed:
+                idempotency_store.release(db.engine, key, claim)
+                raise
+            # The work is in the database, so a retry must get this answer
+            # instead of running the route again
+            logging.error(f"Request failed after commit ({request.endpoint}): {str(e)}")
+            response = jsonify({'success': False, 'message': 'The request was processed, but its response could not be produced.'})
+            response.status_code = 500
+            idempotency_store.complete(db.engine, key, claim, response)
+            return response
+        
+        # Uncommitted work is discarded at teardown anyway; end it now so its
+        # locks do not block storing the response
+        committed = db.session.info['committed']
+        db.session.rollback()
+        db.session.info.pop('idempotency_claim', None)
+        claim = db.session.info.pop('idempotency_token', stored)
+        
+        # Rejections and failures that committed nothing did no work, so let
+        # the retry run for real
+        if not committed and (response.status_code == 429 or response.status_code >= 500):
+            idempotency_store.release(db.engine, key, claim)
+        else:
+            idempotency_store.complete(db.engine, key, claim, response)
+        return response
+    
+    return decorated
+
+def in_progress_response():
+    response = jsonify({'success': False, 'message': 'This request is still being processed.'})
+    response.status_code = 409
+    response.headers['Retry-After'] = '1'
+    return response
+
+# Lets idempotent() tell whether a route's work reached the database
+@event.listens_for(db.session, 'after_commit')
+def mark_committed(session):
+    session.info['committed'] = True
+
+# Marks an idempotency key done in the same transaction as the route's first commit
+@event.listens_for(db.session, 'before_commit')
+def mark_idempotency_key_done(session):
+    pending = session.info.pop('idempotency_claim', None)
+    if pending:
+        key, claim, stand_in = pending
+        session.info['idempotency_token'] = idempotency_store.mark_done(session, key, claim, stand_in)
+
 # Home route
 @app.route('/')
 def index():
@@ -154,7 +403,12 @@ def register():
             return render_template('register.html')
         
         # Create new user
-        hashed_password = generate_password_hash(password)
+        try:
+            hashed_password = password_hasher.hash(password, client=request.remote_addr)
+        except HashingBusy:
+            flash('Too many requests. Please try again in a moment.', 'danger')
+            return render_template('register.html'), 429
+        
         new_user = User(
             name=name,
             car_number=car_number,
@@ -181,7 +435,18 @@ def login():
         
         user = User.query.filter_by(car_number=car_number).first()
         
-        if not user or not check_password_hash(user.password_hash, password):
+        try:
+            valid = user is not None and password_hasher.verify(user.password_hash, password, client=request.remote_addr)
+            
+            # Upgrade hashes made with an older method or cost
+            if valid and password_hasher.needs_rehash(user.password_hash):
+                user.password_hash = password_hasher.hash(password, client=request.remote_addr)
+                db.session.commit()
+        except HashingBusy:
+            flash('Too many login attempts. Please try again in a moment.', 'danger')
+            return render_template('login.html'), 429
+        
+        if not valid:
             flash('Please check your login details and try again.', 'danger')
             return render_template('login.html')
         
@@ -194,6 +459,8 @@ def login():
         # Store token in session
         session['x-access-token'] = token
         session['user_id'] = user.id
+        request.environ['parkease.user_id'] = user.id
+        request.environ['parkease.is_admin'] = user.is_admin
         
         flash('Login successful!', 'success')
         return redirect(url_for('dashboard'))
@@ -246,11 +513,17 @@ def dashboard(current_user):
 @app.route('/wallet')
 @token_required
 def wallet(current_user):
-    transactions = Transaction.query.filter_by(user_id=current_user.id).order_by(Transaction.timestamp.desc()).limit(10).all()
-    return render_template('wallet.html', user=current_user, transactions=transactions)
+    def build_transaction_list():
+        transactions = Transaction.query.filter_by(user_id=current_user.id).order_by(Transaction.timestamp.desc()).limit(10).all()
+        return render_template('fragments/transactions.html', transactions=transactions)
+    
+    transaction_list = fragment_cache.render('transactions', [f'wallet:{current_user.id}'], build_transaction_list)
+    return render_template('wallet.html', user=current_user, transaction_list=transaction_list,
+                           idempotency_key=secrets.token_urlsafe(16))
 
 @app.route('/add_funds', methods=['POST'])
 @token_required
+@idempotent
 def add_funds(current_user):
     amount = request.form.get('amount')
     
@@ -274,6 +547,7 @@ def add_funds(current_user):
         
         db.session.add(transaction)
         db.session.commit()
+        fragment_cache.bump(f'wallet:{current_user.id}')
         
         flash(f'₹{amount} added to your wallet successfully.', 'success')
     except ValueError:
@@ -306,9 +580,23 @@ def parking_entry(current_user):
 
 @app.route('/generate_entry_qr', methods=['POST'])
 @token_required
+@idempotent
+@rate_limited('qr')
 def generate_entry_qr(current_user):
-    # Find nearest available parking slot
-    available_slot = ParkingSlot.query.filter_by(status='Available').first()
+    now = datetime.utcnow()
+    available_slot = None
+    
+    # Use the reserved slot if the user has a booking for now
+    reservation = claim_reservation(current_user.id, now, app.config["RESERVATION_GRACE_MINUTES"])
+    if reservation:
+        reserved_slot = ParkingSlot.query.get(reservation.slot_id)
+        if reserved_slot.status == 'Available':
+            available_slot = reserved_slot
+        reservation.status = 'Fulfilled'
+    
+    # Otherwise find nearest available slot that is not booked soon
+    if not available_slot:
+        available_slot = pick_walk_in_slot(db.session, reservation_index, now, app.config["RESERVATION_HORIZON_MINUTES"])
     
     if not available_slot:
         return jsonify({'success': False, 'message': 'No parking slots available.'})
@@ -317,6 +605,7 @@ def generate_entry_qr(current_user):
     available_slot.status = 'Occupied'
     available_slot.occupied_by = current_user.id
     available_slot.occupied_at = datetime.utcnow()
+    event_log.record(db.session, ENTRY, available_slot.id, current_user.id)
     
     # Create QR code data
     qr_data = {
@@ -361,6 +650,8 @@ def generate_entry_qr(current_user):
     
     db.session.add(db_qr)
     db.session.commit()
+    slot_status.transition('Available', 'Occupied')
+    fragment_cache.bump('slots')
     
     return jsonify({
         'success': True, 
@@ -398,6 +689,61 @@ def confirm_entry(current_user, qr_id):
     flash(f'Parking entry confirmed. Your slot number is {ParkingSlot.query.get(qr_code.slot_id).slot_number}.', 'success')
     return redirect(url_for('dashboard'))
 
+# Advance reservations
+@app.route('/reservations', methods=['GET'])
+@token_required
+def list_reservations(current_user):
+    reservations = Reservation.query.filter(
+        Reservation.user_id == current_user.id,
+        Reservation.status == 'Booked',
+        Reservation.end_at > datetime.utcnow()
+    ).order_by(Reservation.start_at).all()
+    
+    return jsonify({
+        'success': True,
+        'reservations': [{
+            'id': reservation.id,
+            'slot_number': reservation.slot.slot_number,
+            'start': reservation.start_at.isoformat(),
+            'end': reservation.end_at.isoformat()
+        } for reservation in reservations]
+    })
+
+@app.route('/reservations', methods=['POST'])
+@token_required
+def create_reservation(current_user):
+    try:
+        start = parse_utc(request.form.get('start'))
+        end = parse_utc(request.form.get('end'))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Start and end must be ISO date-times (UTC).'})
+    
+    try:
+        reservation = book_slot(db.session, reservation_index, current_user.id, start, end)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    
+    return jsonify({
+        'success': True,
+        'reservation_id': reservation.id,
+        'slot_number': reservation.slot.slot_number,
+        'message': f'Slot {reservation.slot.slot_number} reserved.'
+    })
+
+@app.route('/reservations/<int:reservation_id>/cancel', methods=['POST'])
+@token_required
+def cancel_reservation(current_user, reservation_id):
+    reservation = Reservation.query.get_or_404(reservation_id)
+    
+    if reservation.user_id != current_user.id or reservation.status != 'Booked':
+        return jsonify({'success': False, 'message': 'Reservation cannot be cancelled.'})
+    
+    reservation.status = 'Cancelled'
+    db.session.commit()
+    reservation_index.remove(reservation)
+    
+    return jsonify({'success': True, 'message': 'Reservation cancelled.'})
+
 # Parking exit
 @app.route('/parking/exit')
 @token_required
@@ -453,6 +799,7 @@ def bill_scanner(current_user):
 
 @app.route('/verify_bill', methods=['POST'])
 @token_required
+@rate_limited('bill')
 def verify_bill(current_user):
     barcode = request.form.get('barcode')
     
@@ -487,6 +834,7 @@ def verify_bill(current_user):
     bill.status = 'Used'
     bill.used_by = current_user.id
     bill.used_at = datetime.utcnow()
+    event_log.record(db.session, BILL, active_qr.slot_id, current_user.id, bill.id)
     
     db.session.commit()
     print(f"Bill marked as used: {barcode}")
@@ -544,6 +892,7 @@ def verify_bill(current_user):
 
 @app.route('/bill/verify_bill', methods=['POST'])
 @token_required
+@rate_limited('bill')
 def api_verify_bill(current_user):
     barcode = request.form.get('barcode')
     
@@ -583,6 +932,8 @@ def api_verify_bill(current_user):
 
 @app.route('/generate_exit_qr', methods=['POST'])
 @token_required
+@idempotent
+@rate_limited('qr')
 def generate_exit_qr(current_user):
     is_free_exit = request.form.get('is_free_exit') == 'true'
     charges = float(request.form.get('charges', 0))
@@ -665,6 +1016,8 @@ def generate_exit_qr(current_user):
     
     db.session.add(db_qr)
     db.session.commit()
+    if not is_free_exit:
+        fragment_cache.bump(f'wallet:{current_user.id}')
     
     return jsonify({
         'success': True, 
@@ -700,6 +1053,7 @@ def confirm_exit(current_user, qr_id):
     slot.status = 'Available'
     slot.occupied_by = None
     slot.occupied_at = None
+    event_log.record(db.session, EXIT, slot.id, current_user.id)
     
     # Mark QR as used
     qr_code.is_used = True
@@ -717,14 +1071,34 @@ def confirm_exit(current_user, qr_id):
         entry_qr.is_active = False
     
     db.session.commit()
+    slot_status.transition('Occupied', 'Available')
+    fragment_cache.bump('slots')
     
     flash('Parking exit confirmed. Thank you for using ParkEase!', 'success')
     return redirect(url_for('dashboard'))
 
+# Public parking status for kiosks and the status widget
+@app.route('/api/status')
+def api_status():
+    status = slot_status.snapshot(db.session)
+    
+    response = app.response_class(status['body'], mimetype='application/json')
+    response.set_etag(status['etag'])
+    response.last_modified = status['last_modified']
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    
+    # Turns into a 304 when the client's ETag or Last-Modified still matches
+    return response.make_conditional(request)
+
 # Admin routes
 @app.route('/admin/slots')
 @admin_required
 def admin_slots(current_user):
+    slot_grid = fragment_cache.render('slot_grid', ['slots'], lambda: render_template('fragments/slot_grid.html', slots=load_slot_data()))
+    return render_template('admin_slots.html', user=current_user, slot_grid=slot_grid)
+
+def load_slot_data():
     slots = ParkingSlot.query.all()
     
     # Get user info for occupied slots
@@ -748,7 +1122,96 @@ def admin_slots(current_user):
         
         slot_data.append(data)
     
-    return render_template('admin_slots.html', user=current_user, slots=slot_data)
+    return slot_data
+
+@app.route('/admin/cache_stats')
+@admin_required
+def admin_cache_stats(current_user):
+    return jsonify(fragment_cache.report())
+
+# Bulk slot administration
+def slot_range_from_form():
+    try:
+        return int(request.form.get('first')), int(request.form.get('last'))
+    except (TypeError, ValueError):
+        return None
+
+@app.route('/admin/slots/create_range', methods=['POST'])
+@admin_required
+def admin_create_slot_range(current_user):
+    slot_range = slot_range_from_form()
+    if not slot_range:
+        return jsonify({'success': False, 'message': 'Invalid slot range.'})
+    
+    try:
+        result = create_slot_range(
+            db.session, *slot_range,
+            zone=request.form.get('zone') or None,
+            status=request.form.get('status', 'Available'),
+            event_log=event_log
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    
+    slot_status.invalidate()
+    reservation_index.invalidate()
+    fragment_cache.bump('slots')
+    return jsonify({'success': True, **result})
+
+@app.route('/admin/slots/set_status', methods=['POST'])
+@admin_required
+def admin_set_slot_status(current_user):
+    slot_range = slot_range_from_form()
+    if not slot_range:
+        return jsonify({'success': False, 'message': 'Invalid slot range.'})
+    
+    try:
+        result = set_range_status(db.session, *slot_range, request.form.get('status'), event_log=event_log)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    
+    slot_status.invalidate()
+    reservation_index.invalidate()
+    fragment_cache.bump('slots')
+    return jsonify({'success': True, **result})
+
+@app.route('/admin/zones/<zone>/maintenance', methods=['POST'])
+@admin_required
+def admin_zone_maintenance(current_user, zone):
+    maintenance = request.form.get('maintenance', 'true') == 'true'
+    result = set_zone_maintenance(db.session, zone, maintenance, event_log=event_log)
+    
+    slot_status.invalidate()
+    reservation_index.invalidate()
+    fragment_cache.bump('slots')
+    return jsonify({'success': True, 'zone': zone, 'maintenance': maintenance, **result})
+
+# Register a corporate fleet from an uploaded CSV (larger files: flask --app main onboard-fleet)
+@app.route('/admin/fleet/onboard', methods=['POST'])
+@admin_required
+def admin_onboard_fleet(current_user):
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'success': False, 'message': 'Upload a CSV file.'})
+    
+    from fleet import onboard_fleet, read_fleet_csv
+    
+    try:
+        report = onboard_fleet(
+            db.session, read_fleet_csv(io.TextIOWrapper(upload.stream, encoding='utf-8-sig')), password_hasher,
+            batch_size=app.config["FLEET_BATCH_SIZE"],
+            max_workers=app.config["FLEET_UPLOAD_HASH_WORKERS"],
+            max_rows=app.config["FLEET_UPLOAD_MAX_ROWS"],
+            dry_run=request.form.get('dry_run') == 'true'
+        )
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Could not read the CSV file: {e}'})
+    
+    if report['truncated']:
+        report['message'] = (f"Only the first {app.config['FLEET_UPLOAD_MAX_ROWS']} rows were processed. "
+                             "Use flask onboard-fleet for larger files.")
+    return jsonify({'success': True, **report})
 
 # Create admin user if not exists
 @app.route('/create_admin', methods=['GET'])
@@ -804,6 +1267,100 @@ def create_test_bills():
     flash('Test bills created successfully. Use barcodes: 123456789, 987654321, 456789123', 'success')
     return redirect(url_for('index'))
 
+# Archive old QR codes and transactions: flask --app main archive [--compact]
+@app.cli.command('archive')
+@click.option('--compact', is_flag=True, help='Reclaim free space after archiving.')
+def archive_command(compact):
+    from retention import run_retention
+    
+    # The request statement timeout would cancel large deletes and VACUUM
+    engine = storage.maintenance_engine(app.config["SQLALCHEMY_DATABASE_URI"], app.config["STORAGE_PROFILE"])
+    try:
+        report = run_retention(db, policy={
+            'qr_days': app.config["RETENTION_QR_DAYS"],
+            'transaction_days': app.config["RETENTION_TRANSACTION_DAYS"],
+            'batch_size': app.config["RETENTION_BATCH_SIZE"],
+            'mode': app.config["RETENTION_MODE"],
+            'archive_dir': app.config["RETENTION_ARCHIVE_DIR"],
+            'compact': compact,
+        }, engine=engine)
+        report['idempotency_keys_swept'] = idempotency_store.sweep(engine)
+    finally:
+        engine.dispose()
+    
+    click.echo(json.dumps(report, indent=2))
+
+# Measure rate limiter decision overhead: flask --app main ratelimit-bench
+@app.cli.command('ratelimit-bench')
+@click.option('-n', default=10000, help='Number of decisions to time.')
+def ratelimit_bench_command(n):
+    click.echo(f"{rate_limiter.benchmark(n):.1f} us per decision (user + IP bucket)")
+
+# Gate event log maintenance: flask --app main events-snapshot / events-rebuild / events-bench
+@app.cli.command('events-snapshot')
+def events_snapshot_command():
+    click.echo(f"Snapshot written at event {event_log.snapshot()}")
+
+@app.cli.command('events-rebuild')
+def events_rebuild_command():
+    start = time.perf_counter()
+    seq, state = event_log.rebuild()
+    elapsed = time.perf_counter() - start
+    occupied = sum(1 for status, user_id in state.values() if status == 1)
+    click.echo(f"Rebuilt {len(state)} slots ({occupied} occupied) up to event {seq} in {elapsed * 1000:.1f} ms")
+
+@app.cli.command('events-bench')
+@click.option('--events', default=10000000, help='Number of synthetic events.')
+@click.option('--directory', default=None, help='Scratch directory (default: a temporary one).')
+def events_bench_command(events, directory):
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as scratch:
+        click.echo(json.dumps(benchmark_rebuild(directory or scratch, events=events), indent=2))
+
+# Register a corporate fleet from a CSV: flask --app main onboard-fleet vehicles.csv [--dry-run]
+@app.cli.command('onboard-fleet')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--dry-run', is_flag=True, help='Validate and check duplicates only.')
+@click.option('--batch-size', default=None, type=int, help='Vehicles per transaction.')
+def onboard_fleet_command(csv_file, dry_run, batch_size):
+    from fleet import onboard_fleet, read_fleet_csv
+    
+    try:
+        report = onboard_fleet(
+            db.session, read_fleet_csv(csv_file), password_hasher,
+            batch_size=batch_size or app.config["FLEET_BATCH_SIZE"],
+            max_workers=app.config["FLEET_HASH_WORKERS"],
+            dry_run=dry_run
+        )
+    except (ValueError, csv.Error) as e:
+        raise click.ClickException(str(e))
+    
+    click.echo(json.dumps(report, indent=2))
+
+# Compare bulk onboarding with one-by-one registration: flask --app main fleet-bench
+@app.cli.command('fleet-bench')
+@click.option('--users', default=2000, help='Vehicles to onboard in bulk.')
+@click.option('--baseline-users', default=100, help='Vehicles to register one by one.')
+@click.option('--hash-method', default=None, help='Hash method override, e.g. a cheap one to isolate database cost.')
+def fleet_bench_command(users, baseline_users, hash_method):
+    from fleet import benchmark_onboarding
+    
+    hasher = PasswordHasher(method=hash_method) if hash_method else password_hasher
+    results = benchmark_onboarding(db.metadata, hasher, users=users, baseline_users=baseline_users,
+                                   batch_size=app.config["FLEET_BATCH_SIZE"],
+                                   max_workers=app.config["FLEET_HASH_WORKERS"])
+    click.echo(json.dumps(results, indent=2))
+
+# Compare storage profiles: flask --app main storage-bench [--postgres-url URL]
+@app.cli.command('storage-bench')
+@click.option('--postgres-url', default=None, help='Empty scratch PostgreSQL database to include.')
+@click.option('--threads', default=8, help='Concurrent gate workers.')
+@click.option('--operations', default=200, help='Transactions per worker.')
+def storage_bench_command(postgres_url, threads, operations):
+    results = storage.benchmark_profiles(db.metadata, postgres_url, threads=threads, operations=operations)
+    click.echo(json.dumps(results, indent=2))
+
 # Error handlers
 @app.errorhandler(404)
 def page_not_found(e):
@@ -0,0 +1,154 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import threading
+from io import BytesIO
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.formparser import parse_form_data
+from werkzeug.wsgi import ClosingIterator
+
+# Request bodies whose fields are recorded
+FORM_TYPES = {'application/x-www-form-urlencoded', 'multipart/form-data'}
+
+# Form fields recorded as-is; every other field is replaced by a keyed hash,
+# and passwords are dropped entirely
+KEEP_FIELDS = {'amount', 'charges', 'is_free_exit', 'barcode', 'start', 'end',
+               'first', 'last', 'status', 'zone', 'maintenance'}
+DROP_FIELDS = {'password'}
+
+
+class TrafficCapture:
+    """
+    WSGI middleware that records an anonymised trace of every request.
+
+    Each line of the capture is a compact JSON object:
+        t  start time (unix seconds)     m  method
+        r  URL rule, e.g. /confirm_exit/<int:qr_id>
+        a  path arguments                p  form parameters (anonymised)
+        u  pseudonymous user id          x  1 if the user is an admin
+        s  status code                   d  duration in milliseconds
+
+    User ids are replaced by a keyed hash so a capture can leave production
+    without exposing accounts. Each worker writes its own file and starts a
+    new one after `max_bytes`, keeping the newest `keep_files`.
+
+    Args:
+        wsgi_app: Wrapped WSGI application
+        url_map (Map): Flask URL map used to resolve rules
+        directory (str): Capture directory
+        salt (str): Key for pseudonymising user ids and fields
+        max_bytes (int): Size at which a capture file is rotated
+        keep_files (int): Capture files kept per worker
+        max_body (int): Largest request body that is parsed for form parameters
+    """
+
+    def __init__(self, wsgi_app, url_map, directory, salt, max_bytes=50 * 1024 * 1024, keep_files=10, max_body=65536):
+        self.wsgi_app = wsgi_app
+        self.url_map = url_map
+        self.directory = directory
+        self.salt = salt.encode()
+        self.max_bytes = max_bytes
+        self.keep_files = keep_files
+        self.max_body = max_body
+        self._lock = threading.Lock()
+        self._file = None
+        self._files = []
+        self._pid = None
+
+    def _pseudonym(self, value):
+        return hmac.new(self.salt, str(value).encode(), hashlib.sha256).hexdigest()[:12]
+
+    def _read_form(self, environ):
+        if environ.get('CONTENT_TYPE', '').split(';')[0].strip() not in FORM_TYPES:
+            return {}
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return {}
+        if not length or length > self.max_body:
+            return {}
+
+        # Parse a buffered copy and put the body back so the application can still read it
+        body = environ['wsgi.input'].read(length)
+        environ['wsgi.input'] = BytesIO(body)
+        _, form, _ = parse_form_data({**environ, 'wsgi.input': BytesIO(body), 'CONTENT_LENGTH': str(len(body))},
+                                     silent=True)
+
+        # File parts (e.g. fleet CSV uploads) are left out
+        params = {}
+        for key, value in form.items(multi=True):
+            if key in DROP_FIELDS:
+                continue
+            params[key] = value if key in KEEP_FIELDS else self._pseudonym(value)
+        return params
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'capture-{os.getpid()}-{int(time.time() * 1000)}.jsonl')
+        self._file = open(path, 'a', encoding='utf-8')
+        self._files.append(path)
+        self._pid = os.getpid()
+
+        while len(self._files) > self.keep_files:
+            try:
+                os.remove(self._files.pop(0))
+            except OSError:
+                pass
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None or self._pid != os.getpid() or self._file.tell() > self.max_bytes:
+                if self._file is not None and self._pid == os.getpid():
+                    self._file.close()
+                else:
+                    self._files = []
+                self._open()
+            self._file.write(line)
+            self._file.flush()
+
+    def __call__(self, environ, start_response):
+        try:
+            rule, args = self.url_map.bind_to_environ(environ).match(return_rule=True)
+        except HTTPException:
+            rule, args = None, {}
+
+        # Static files and unknown URLs are not part of the request mix
+        if rule is None or rule.endpoint == 'static':
+            return self.wsgi_app(environ, start_response)
+
+        started = time.time()
+        start = time.perf_counter()
+        params = self._read_form(environ)
+        status = []
+
+        def capture_start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(' ', 1)[0]))
+            return start_response(status_line, headers, exc_info)
+
+        def finish():
+            user_id = environ.get('parkease.user_id')
+            record = {
+                't': round(started, 3),
+                'm': environ['REQUEST_METHOD'],
+                'r': rule.rule,
+                'a': args,
+                'p': params,
+                'u': self._pseudonym(user_id) if user_id is not None else None,
+                's': status[0] if status else 500,
+                'd': round((time.perf_counter() - start) * 1000, 2),
+            }
+            if environ.get('parkease.is_admin'):
+                record['x'] = 1
+            self._write(record)
+
+        try:
+            app_iter = self.wsgi_app(environ, capture_start_response)
+        except Exception:
+            finish()
+            raise
+
+        return ClosingIterator(app_iter, finish)
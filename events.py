@@ -0,0 +1,371 @@
+import os
+import glob
+import time
+import struct
+import logging
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, func, insert, select
+
+# Event kinds
+ENTRY, EXIT, BILL, SLOT = 1, 2, 3, 4
+
+# Slot states kept in the rebuilt occupancy map
+STATUS_CODES = {'Available': 0, 'Occupied': 1, 'Maintenance': 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+# seq, kind, slot_id, user_id, ref (bill id or status code), unix time
+RECORD = struct.Struct('<QBIIId')
+# snapshot seq, number of slots; then per slot: slot_id, status, user_id
+SNAPSHOT_HEADER = struct.Struct('<QI')
+SNAPSHOT_ENTRY = struct.Struct('<IBI')
+
+
+class EventLog:
+    """
+    Append-only log of gate events.
+
+    Every event is inserted into the gate_event table in the same
+    transaction as the change it describes, and once that transaction
+    commits it is appended as a fixed-size record to a segment file. The
+    segment is chosen from the event id, so workers writing concurrently
+    never need to coordinate rotation.
+
+    rebuild() restores slot occupancy from the latest snapshot plus the
+    records after it. Each record carries its id and sets a slot's whole
+    state, so records that land in the file slightly out of order are
+    resolved by keeping the highest id per slot.
+
+    Snapshots are built from the gate_event table, not the files: a worker
+    may append a record with an id below the snapshot after the snapshot
+    was written, and rebuild() would skip it for good. The table is only
+    read up to events older than `settle_seconds`, longer than any gate
+    transaction may stay open (see the PostgreSQL timeouts in storage.py),
+    so every event at or below a snapshot has committed.
+
+    Args:
+        directory (str): Directory for segment and snapshot files
+        segment_events (int): Events per segment file
+        snapshot_every (int): Take a snapshot each time this many events were logged
+        settle_seconds (float): Age after which an event id is known to be committed
+    """
+
+    def __init__(self, directory, segment_events=1000000, snapshot_every=100000, settle_seconds=60):
+        self.directory = directory
+        self.segment_events = segment_events
+        self.snapshot_every = snapshot_every
+        self.settle_seconds = settle_seconds
+        self.engine = None
+        self._snapshot_lock = threading.Lock()
+
+    def bind(self, engine):
+        """
+        Read committed events from the gate_event table when snapshotting
+        """
+        self.engine = engine
+
+    def init_session(self, session):
+        """
+        Hook the log into a session so records are written when it commits
+        """
+        event.listen(session, 'after_flush', self._after_flush)
+        event.listen(session, 'after_commit', self._after_commit)
+        event.listen(session, 'after_rollback', self._after_rollback)
+
+    def record(self, session, kind, slot_id=0, user_id=0, ref=0):
+        """
+        Add an event to the current transaction
+        """
+        from models import GateEvent
+
+        gate_event = GateEvent(kind=kind, slot_id=slot_id or 0, user_id=user_id or 0, ref=ref or 0,
+                               created_at=datetime.utcnow())
+        session.add(gate_event)
+        session.info.setdefault('gate_events', []).append(gate_event)
+
+    def record_many(self, session, kind, rows):
+        """
+        Add a batch of events with one multi-row INSERT
+
+        Args:
+            rows (list): (slot_id, user_id, ref) tuples
+        """
+        from models import GateEvent
+
+        if not rows:
+            return
+        now = datetime.utcnow()
+        table = GateEvent.__table__
+        ids = session.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True),
+            [{'kind': kind, 'slot_id': slot_id, 'user_id': user_id, 'ref': ref, 'created_at': now}
+             for slot_id, user_id, ref in rows]
+        ).scalars().all()
+
+        ts = _epoch(now)
+        session.info.setdefault('gate_records', []).extend(
+            (seq, kind, slot_id, user_id, ref, ts) for seq, (slot_id, user_id, ref) in zip(ids, rows)
+        )
+
+    def _after_flush(self, session, flush_context):
+        pending = session.info.pop('gate_events', None)
+        if pending:
+            session.info.setdefault('gate_records', []).extend(
+                (e.id, e.kind, e.slot_id, e.user_id, e.ref, _epoch(e.created_at)) for e in pending
+            )
+
+    def _after_commit(self, session):
+        records = session.info.pop('gate_records', None)
+        if records:
+            # The events are committed to gate_event, which snapshots are
+            # built from, so a failed file append must not fail the request
+            try:
+                self.append(records)
+            except Exception as e:
+                logging.error(f"Appending events {records[0][0]}-{records[-1][0]} to the log failed: {str(e)}")
+
+    def _after_rollback(self, session):
+        session.info.pop('gate_events', None)
+        session.info.pop('gate_records', None)
+
+    def _segment_path(self, index):
+        return os.path.join(self.directory, f'segment-{index:08d}.log')
+
+    def append(self, records, snapshot=True):
+        """
+        Append committed records to their segment files, snapshotting in
+        the background when they cross a `snapshot_every` boundary
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        by_segment = {}
+        for record in records:
+            by_segment.setdefault((record[0] - 1) // self.segment_events, []).append(RECORD.pack(*record))
+
+        # One O_APPEND write per segment keeps records from different workers whole
+        for index, chunks in by_segment.items():
+            fd = os.open(self._segment_path(index), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, b''.join(chunks))
+            finally:
+                os.close(fd)
+
+        if not snapshot:
+            return
+
+        last = max(record[0] for record in records)
+        first = min(record[0] for record in records)
+        boundary = last - last % self.snapshot_every
+        if boundary >= first and boundary > 0:
+            threading.Thread(target=self._delayed_snapshot, args=(boundary,), daemon=True).start()
+
+    def _delayed_snapshot(self, seq):
+        # Wait until every event up to seq has committed
+        time.sleep(self.settle_seconds if self.engine is not None else 1)
+        try:
+            self.snapshot(seq)
+        except Exception as e:
+            logging.error(f"Event snapshot at {seq} failed: {str(e)}")
+
+    def _latest_snapshot(self, upto=None):
+        snapshots = sorted(glob.glob(os.path.join(self.directory, 'snapshot-*.bin')), reverse=True)
+        for path in snapshots:
+            seq = int(os.path.basename(path)[9:-4])
+            if upto is not None and seq > upto:
+                continue
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            seq, count = SNAPSHOT_HEADER.unpack_from(data)
+            # Each slot keeps the id that set it; 0 for state from a snapshot
+            state = {
+                slot_id: (0, status, user_id)
+                for slot_id, status, user_id in SNAPSHOT_ENTRY.iter_unpack(data[SNAPSHOT_HEADER.size:])
+            }
+            return seq, state
+
+        return 0, {}
+
+    def _tail_offset(self, data, seq, slack=1000):
+        """
+        Byte offset in a segment from which every record after `seq` follows.
+        Records are appended in nearly increasing id order, so a binary search
+        for a point `slack` ids earlier is safe.
+        """
+        target = seq - slack
+        lo, hi = 0, len(data) // RECORD.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from('<Q', data, mid * RECORD.size)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo * RECORD.size
+
+    def rebuild(self, upto=None):
+        """
+        Restore slot occupancy from the latest snapshot and the events after it
+
+        Args:
+            upto (int, optional): Ignore events after this id
+
+        Returns:
+            tuple: (last event id applied, {slot_id: (status code, user_id)})
+        """
+        seq, state = self._latest_snapshot(upto)
+        last = seq
+
+        first_segment = seq // self.segment_events
+        for path in sorted(glob.glob(os.path.join(self.directory, 'segment-*.log'))):
+            if int(os.path.basename(path)[8:-4]) < first_segment:
+                continue
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Ignore a torn record at the end of a segment still being written
+            data = memoryview(data)[:len(data) - len(data) % RECORD.size]
+
+            for event_seq, kind, slot_id, user_id, ref, ts in RECORD.iter_unpack(data[self._tail_offset(data, seq):]):
+                if event_seq <= seq or (upto is not None and event_seq > upto):
+                    continue
+                if event_seq > last:
+                    last = event_seq
+                _apply(state, event_seq, kind, slot_id, user_id, ref)
+
+        return last, {slot_id: (status, user_id) for slot_id, (_, status, user_id) in state.items()}
+
+    def _settled_seq(self, conn):
+        from models import GateEvent
+
+        table = GateEvent.__table__
+        cutoff = datetime.utcnow() - timedelta(seconds=self.settle_seconds)
+        return conn.execute(select(func.max(table.c.id)).where(table.c.created_at < cutoff)).scalar() or 0
+
+    def _rebuild_from_table(self, upto):
+        """
+        Occupancy at event `upto` (default: the newest settled event) from
+        the latest snapshot plus committed gate_event rows
+        """
+        from models import GateEvent
+
+        table = GateEvent.__table__
+        with self.engine.connect() as conn:
+            if upto is None:
+                upto = self._settled_seq(conn)
+            seq, state = self._latest_snapshot(upto)
+            rows = conn.execution_options(yield_per=10000).execute(
+                select(table.c.id, table.c.kind, table.c.slot_id, table.c.user_id, table.c.ref)
+                .where(table.c.id > seq, table.c.id <= upto)
+                .order_by(table.c.id)
+            )
+            for event_seq, kind, slot_id, user_id, ref in rows:
+                _apply(state, event_seq, kind, slot_id, user_id, ref)
+
+        return max(seq, upto), {slot_id: (status, user_id) for slot_id, (_, status, user_id) in state.items()}
+
+    def snapshot(self, upto=None):
+        """
+        Write the occupancy at event `upto` to a snapshot file. With a bound
+        engine it is built from the gate_event table (default: up to the
+        newest settled event), otherwise from the segment files.
+
+        Returns:
+            int: Event id the snapshot covers
+        """
+        with self._snapshot_lock:
+            if self.engine is not None:
+                seq, state = self._rebuild_from_table(upto)
+            else:
+                seq, state = self.rebuild(upto)
+            if not seq:
+                return 0
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'snapshot-{seq:012d}.bin')
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(SNAPSHOT_HEADER.pack(seq, len(state)))
+                f.write(b''.join(SNAPSHOT_ENTRY.pack(slot_id, status, user_id)
+                                 for slot_id, (status, user_id) in state.items()))
+            os.replace(tmp_path, path)
+
+            return seq
+
+
+def _epoch(value):
+    # created_at is naive UTC; .timestamp() on a naive datetime assumes local time
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _apply(state, event_seq, kind, slot_id, user_id, ref):
+    if kind == BILL:
+        return
+    current = state.get(slot_id)
+    if current is not None and current[0] > event_seq:
+        return
+    if kind == ENTRY:
+        state[slot_id] = (event_seq, 1, user_id)
+    elif kind == EXIT:
+        state[slot_id] = (event_seq, 0, 0)
+    else:
+        state[slot_id] = (event_seq, ref, 0)
+
+
+def occupancy_counts(occupancy):
+    """
+    Count slots per status name in an occupancy map from rebuild()
+    """
+    counts = {}
+    for status, _ in occupancy.values():
+        name = STATUS_NAMES[status]
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def benchmark_rebuild(directory, events=10000000, slots=2000, users=50000):
+    """
+    Time occupancy rebuild over a synthetic log of `events` entries/exits
+
+    Returns:
+        dict: Seconds to write the log, rebuild from the latest snapshot, and replay everything
+    """
+    log = EventLog(directory)
+    os.makedirs(directory, exist_ok=True)
+
+    # Alternate entry/exit per slot so the replay exercises real transitions
+    start = time.perf_counter()
+    batch = []
+    ts = time.time()
+    for seq in range(1, events + 1):
+        slot_id = seq % slots + 1
+        kind = ENTRY if (seq // slots) % 2 == 0 else EXIT
+        batch.append((seq, kind, slot_id, seq % users + 1 if kind == ENTRY else 0, 0, ts))
+        if len(batch) == 100000:
+            log.append(batch, snapshot=False)
+            batch = []
+    if batch:
+        log.append(batch, snapshot=False)
+    write_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    full_seq, full_state = log.rebuild()
+    full_seconds = time.perf_counter() - start
+
+    # Leave half a snapshot interval of tail to replay, the average case
+    log.snapshot(events - log.snapshot_every // 2)
+
+    start = time.perf_counter()
+    seq, state = log.rebuild()
+    snapshot_seconds = time.perf_counter() - start
+
+    if seq != full_seq or state != full_state:
+        raise RuntimeError(f"Rebuild from the snapshot (event {seq}) does not match the full replay (event {full_seq})")
+
+    return {
+        'events': events,
+        'write_seconds': round(write_seconds, 2),
+        'full_replay_seconds': round(full_seconds, 2),
+        'snapshot_rebuild_seconds': round(snapshot_seconds, 4),
+    }
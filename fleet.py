@@ -0,0 +1,253 @@
+import csv
+import time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+# Columns a fleet CSV must have; opening_balance is optional
+FLEET_COLUMNS = ('name', 'car_number', 'mobile', 'password')
+
+# Rejected rows listed in the report (the rest are only counted)
+MAX_REPORTED_ERRORS = 100
+
+
+def read_fleet_csv(stream):
+    """
+    Read vehicles from a CSV text stream one row at a time
+
+    Args:
+        stream: Text file object with a header row
+
+    Yields:
+        tuple: (line number, row dict)
+    """
+    reader = csv.DictReader(stream)
+    missing = [column for column in FLEET_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _parse_row(row):
+    values = {column: (row.get(column) or '').strip() for column in FLEET_COLUMNS}
+    if not all(values.values()):
+        raise ValueError('All of name, car_number, mobile and password are required')
+    if len(values['car_number']) > 20 or len(values['mobile']) > 15 or len(values['name']) > 100:
+        raise ValueError('Value too long')
+
+    balance = (row.get('opening_balance') or '').strip()
+    try:
+        values['opening_balance'] = float(balance) if balance else 0.0
+    except ValueError:
+        raise ValueError('Invalid opening_balance')
+    if values['opening_balance'] < 0:
+        raise ValueError('opening_balance cannot be negative')
+    return values
+
+
+class _Onboarding:
+    def __init__(self, session, hasher, max_workers):
+        from models import User, Transaction
+
+        self.session = session
+        self.hasher = hasher
+        self.max_workers = max_workers
+        self.executor = None
+        self.users = User.__table__
+        self.transactions = Transaction.__table__
+        self.seen_cars = set()
+        self.seen_mobiles = set()
+        self.report = {'rows': 0, 'valid': 0, 'created': 0, 'credited': 0, 'rejected': 0, 'errors': []}
+
+    def reject(self, line, reason):
+        self.report['rejected'] += 1
+        if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+            self.report['errors'].append({'line': line, 'reason': reason})
+
+    def existing(self, vehicles):
+        # One set-based query per column instead of two lookups per vehicle
+        cars = set(self.session.execute(select(self.users.c.car_number).where(
+            self.users.c.car_number.in_([v['car_number'] for _, v in vehicles])
+        )).scalars())
+        mobiles = set(self.session.execute(select(self.users.c.mobile).where(
+            self.users.c.mobile.in_([v['mobile'] for _, v in vehicles])
+        )).scalars())
+        return cars, mobiles
+
+    def new_vehicles(self, rows):
+        vehicles = []
+        for line, row in rows:
+            self.report['rows'] += 1
+            try:
+                values = _parse_row(row)
+            except ValueError as e:
+                self.reject(line, str(e))
+                continue
+            if values['car_number'] in self.seen_cars:
+                self.reject(line, 'Duplicate car number in file')
+                continue
+            if values['mobile'] in self.seen_mobiles:
+                self.reject(line, 'Duplicate mobile number in file')
+                continue
+            self.seen_cars.add(values['car_number'])
+            self.seen_mobiles.add(values['mobile'])
+            vehicles.append((line, values))
+
+        if not vehicles:
+            return []
+
+        cars, mobiles = self.existing(vehicles)
+        fresh = []
+        for line, values in vehicles:
+            if values['car_number'] in cars:
+                self.reject(line, 'Car number already registered')
+            elif values['mobile'] in mobiles:
+                self.reject(line, 'Mobile number already registered')
+            else:
+                fresh.append((line, values))
+        return fresh
+
+    def insert(self, vehicles, hashes):
+        now = datetime.utcnow()
+        ids = self.session.execute(
+            insert(self.users).returning(self.users.c.id, sort_by_parameter_order=True),
+            [{'name': v['name'], 'car_number': v['car_number'], 'mobile': v['mobile'], 'password_hash': password_hash,
+              'wallet_balance': v['opening_balance'], 'is_admin': False, 'created_at': now}
+             for (_, v), password_hash in zip(vehicles, hashes)]
+        ).scalars().all()
+
+        credits = [{'user_id': user_id, 'amount': v['opening_balance'], 'type': 'credit',
+                    'description': 'Opening balance', 'timestamp': now}
+                   for user_id, (_, v) in zip(ids, vehicles) if v['opening_balance'] > 0]
+        if credits:
+            self.session.execute(insert(self.transactions), credits)
+        self.session.commit()
+
+        self.report['created'] += len(ids)
+        self.report['credited'] += len(credits)
+
+    def batch(self, rows, dry_run):
+        vehicles = self.new_vehicles(rows)
+        self.report['valid'] += len(vehicles)
+        if not vehicles or dry_run:
+            self.session.rollback()
+            return
+
+        # Started on the first batch that needs hashing, so dry runs and files
+        # with nothing new never fork worker processes
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        hashes = self.hasher.hash_many([v['password'] for _, v in vehicles], executor=self.executor)
+        try:
+            self.insert(vehicles, hashes)
+        except IntegrityError:
+            # Someone registered one of these vehicles meanwhile; drop it and retry once
+            self.session.rollback()
+            cars, mobiles = self.existing(vehicles)
+            keep = []
+            for i, (line, v) in enumerate(vehicles):
+                if v['car_number'] in cars or v['mobile'] in mobiles:
+                    self.reject(line, 'Registered while importing')
+                else:
+                    keep.append(i)
+            if keep:
+                try:
+                    self.insert([vehicles[i] for i in keep], [hashes[i] for i in keep])
+                except IntegrityError:
+                    # Lost the race again; give up on this batch rather than loop
+                    self.session.rollback()
+                    for i in keep:
+                        self.reject(vehicles[i][0], 'Registered while importing')
+
+
+def onboard_fleet(session, rows, hasher, batch_size=500, max_workers=None, max_rows=None, dry_run=False):
+    """
+    Register a fleet of vehicles in batches: duplicates are checked with one
+    query per batch, passwords are hashed in parallel worker processes and
+    users plus their opening wallet credits are inserted with multi-row
+    INSERTs, one transaction per batch.
+
+    Args:
+        session: SQLAlchemy session
+        rows (iterable): (line number, row dict) pairs, e.g. from read_fleet_csv
+        hasher (PasswordHasher): Hasher providing the configured method
+        batch_size (int): Vehicles per transaction
+        max_workers (int, optional): Hashing processes (default: CPU count)
+        max_rows (int, optional): Stop after this many rows
+        dry_run (bool): Validate and check duplicates without hashing or inserting
+
+    Returns:
+        dict: Counts of rows, valid rows, created users, opening credits and rejected rows, with reasons
+    """
+    start = time.perf_counter()
+    rows = iter(rows)
+
+    onboarding = _Onboarding(session, hasher, max_workers)
+    try:
+        while True:
+            remaining = batch_size if max_rows is None else min(batch_size, max_rows - onboarding.report['rows'])
+            batch = list(islice(rows, remaining)) if remaining > 0 else []
+            if not batch:
+                break
+            onboarding.batch(batch, dry_run)
+    finally:
+        if onboarding.executor is not None:
+            onboarding.executor.shutdown()
+
+    report = onboarding.report
+    report['truncated'] = max_rows is not None and report['rows'] >= max_rows and next(rows, None) is not None
+    report['seconds'] = round(time.perf_counter() - start, 2)
+    report['users_per_second'] = round(report['created'] / report['seconds'], 1) if report['seconds'] else None
+    return report
+
+
+def benchmark_onboarding(metadata, hasher, users=2000, baseline_users=100, batch_size=500, max_workers=None):
+    """
+    Compare bulk onboarding with the one-by-one registration path on a
+    scratch SQLite database
+
+    Returns:
+        dict: Users per second for each path
+    """
+    from models import User
+
+    def vehicles(prefix, count):
+        return ((n + 2, {'name': f'Fleet {n}', 'car_number': f'{prefix}{n:08d}', 'mobile': f'{prefix}{n:09d}',
+                         'password': f'fleet-{n}', 'opening_balance': '500'}) for n in range(count))
+
+    with tempfile.NamedTemporaryFile(suffix='.db') as scratch:
+        engine = create_engine(f'sqlite:///{scratch.name}')
+        metadata.create_all(engine)
+
+        with Session(engine) as session:
+            # Same work as the register route: two lookups, one hash, one commit per user
+            table = User.__table__
+            start = time.perf_counter()
+            for _, v in vehicles('S', baseline_users):
+                session.execute(select(table.c.id).where(table.c.car_number == v['car_number'])).first()
+                session.execute(select(table.c.id).where(table.c.mobile == v['mobile'])).first()
+                session.execute(insert(table).values(
+                    name=v['name'], car_number=v['car_number'], mobile=v['mobile'],
+                    password_hash=hasher.hash(v['password']), wallet_balance=0, is_admin=False
+                ))
+                session.commit()
+            baseline_seconds = time.perf_counter() - start
+
+            report = onboard_fleet(session, vehicles('B', users), hasher, batch_size=batch_size, max_workers=max_workers)
+
+        engine.dispose()
+
+    return {
+        'hash_method': hasher.method,
+        'one_by_one_users_per_second': round(baseline_users / baseline_seconds, 1),
+        'bulk_users_per_second': report['users_per_second'],
+        'bulk_users': report['created'],
+        'bulk_seconds': report['seconds'],
+    }
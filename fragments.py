@@ -0,0 +1,142 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+from utils import connect_local_state
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS version (
+    scope TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+
+class FragmentCache:
+    """
+    Bounded in-process LRU of rendered template fragments.
+
+    Each fragment depends on one or more scopes ('slots', 'wallet:<user id>').
+    Routes that change the data behind a scope call bump() after committing.
+    Scope versions live in a local SQLite file so a bump in one worker
+    invalidates the fragments cached by every worker.
+
+    Per-user fragments (any scope of the form '<name>:<id>') have their own
+    LRU, so many active users cannot evict the shared fragments, which are
+    the expensive ones.
+
+    Args:
+        path (str): SQLite file holding scope versions
+        maxsize (int): Maximum number of cached shared fragments
+        user_maxsize (int): Maximum number of cached per-user fragments
+    """
+
+    def __init__(self, path, maxsize=256, user_maxsize=1024):
+        self.path = path
+        self.maxsize = maxsize
+        self.user_maxsize = user_maxsize
+        self._entries = OrderedDict()
+        self._user_entries = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect_local_state(self.path, _SCHEMA)
+        return conn
+
+    def _versions(self, scopes):
+        placeholders = ','.join('?' * len(scopes))
+        rows = dict(self._connection().execute(
+            f'SELECT scope, version FROM version WHERE scope IN ({placeholders})', scopes
+        ).fetchall())
+        return tuple(rows.get(scope, 0) for scope in scopes)
+
+    def bump(self, *scopes):
+        """
+        Invalidate every fragment that depends on the given scopes. Called
+        after the route has committed, so a failure is logged rather than
+        raised: the data change already happened and must not turn into an
+        error response that the client retries.
+        """
+        try:
+            conn = self._connection()
+            for scope in scopes:
+                conn.execute(
+                    'INSERT INTO version (scope, version) VALUES (?, 1) '
+                    'ON CONFLICT(scope) DO UPDATE SET version = version + 1', (scope,)
+                )
+        except Exception as e:
+            logging.error(f"Fragment cache bump of {', '.join(scopes)} failed: {str(e)}")
+
+        # Free this worker's stale copies now instead of waiting for LRU eviction
+        with self._lock:
+            for entries in (self._entries, self._user_entries):
+                for key in [key for key in entries if set(key[1]) & set(scopes)]:
+                    del entries[key]
+
+    def render(self, name, scopes, build):
+        """
+        Get a rendered fragment, building it only when its scopes changed
+
+        Args:
+            name (str): Fragment name
+            scopes (list): Scopes the fragment depends on
+            build (callable): Returns the fragment HTML, including any queries it needs
+
+        Returns:
+            Markup: Rendered fragment, safe to output in a template
+        """
+        scopes = tuple(scopes)
+        key = (name, scopes, self._versions(scopes))
+        if any(':' in scope for scope in scopes):
+            entries, maxsize = self._user_entries, self.user_maxsize
+        else:
+            entries, maxsize = self._entries, self.maxsize
+
+        with self._lock:
+            stats = self._stats.setdefault(name, {'hits': 0, 'misses': 0, 'build_seconds': 0.0})
+            html = entries.get(key)
+            if html is not None:
+                entries.move_to_end(key)
+                stats['hits'] += 1
+                return html
+
+        start = time.perf_counter()
+        html = Markup(build())
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            entries[key] = html
+            while len(entries) > maxsize:
+                entries.popitem(last=False)
+            stats['misses'] += 1
+            stats['build_seconds'] += elapsed
+
+        return html
+
+    def report(self):
+        """
+        Summarise hit rates and the render time saved by cache hits in this worker
+
+        Returns:
+            dict: Per-fragment hits, misses, mean build time and estimated time saved
+        """
+        with self._lock:
+            report = {'entries': len(self._entries), 'maxsize': self.maxsize,
+                      'user_entries': len(self._user_entries), 'user_maxsize': self.user_maxsize,
+                      'fragments': {}}
+            for name, stats in self._stats.items():
+                mean_build = stats['build_seconds'] / stats['misses'] if stats['misses'] else 0.0
+                report['fragments'][name] = {
+                    'hits': stats['hits'],
+                    'misses': stats['misses'],
+                    'mean_build_ms': round(mean_build * 1000, 3),
+                    'saved_ms': round(stats['hits'] * mean_build * 1000, 1),
+                }
+            return report
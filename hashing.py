@@ -0,0 +1,135 @@
+import os
+import threading
+from itertools import repeat
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when the pool or a client already has too many hashing jobs in flight, or a job timed out"""
+    pass
+
+
+class PasswordHasher:
+    """
+    Runs password hashing in a bounded process pool so slow key derivation
+    never blocks the request worker that serves the gate endpoints.
+
+    Args:
+        method (str): Werkzeug hash method with explicit cost, e.g. "scrypt:32768:8:1"
+        max_workers (int): Number of hashing processes
+        max_pending (int): Jobs allowed in flight across all clients; further jobs
+            are refused at once instead of holding a request worker
+        per_client_limit (int): Jobs allowed in flight for a single client
+        timeout (float): Seconds to wait for a hashing job
+    """
+
+    def __init__(self, method="scrypt:32768:8:1", max_workers=2, max_pending=16,
+                 per_client_limit=2, timeout=10.0):
+        self.method = method
+        self.max_workers = max_workers
+        self.per_client_limit = per_client_limit
+        self.timeout = timeout
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._clients = defaultdict(int)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # Pools do not survive a fork, so every gunicorn worker builds its own
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _acquire(self, client):
+        with self._lock:
+            if self._clients[client] >= self.per_client_limit:
+                raise HashingBusy(client)
+            self._clients[client] += 1
+
+        if not self._pending.acquire(blocking=False):
+            self._release_client(client)
+            raise HashingBusy(client)
+
+    def _release_client(self, client):
+        with self._lock:
+            self._clients[client] -= 1
+            if self._clients[client] <= 0:
+                del self._clients[client]
+
+    def _release(self, client):
+        self._pending.release()
+        self._release_client(client)
+
+    def _run(self, client, fn, *args):
+        self._acquire(client)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._release(client)
+            raise
+
+        # The slot is freed when the job finishes, not when the caller gives up,
+        # so timed-out jobs still count against the limits
+        future.add_done_callback(lambda _: self._release(client))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy(client)
+
+    def hash(self, password, client=None):
+        """
+        Hash a password at the configured cost
+
+        Args:
+            password (str): Plain text password
+            client (str, optional): Key used for the per-client limit (e.g. remote address)
+
+        Returns:
+            str: Werkzeug password hash
+        """
+        return self._run(client, generate_password_hash, password, self.method)
+
+    def hash_many(self, passwords, executor=None, chunksize=8):
+        """
+        Hash a batch of passwords in parallel, for bulk imports
+
+        Args:
+            passwords (list): Plain text passwords
+            executor (Executor, optional): Pool to run on. Pass a dedicated pool for
+                large jobs so they do not hold up logins on the shared one.
+            chunksize (int): Passwords sent to a worker process at a time
+
+        Returns:
+            list: Werkzeug password hashes, in input order
+        """
+        executor = executor or self._get_executor()
+        return list(executor.map(generate_password_hash, passwords, repeat(self.method), chunksize=chunksize))
+
+    def verify(self, password_hash, password, client=None):
+        """
+        Check a password against a stored hash
+
+        Returns:
+            bool: True if the password matches
+        """
+        return self._run(client, check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """
+        Check if a stored hash was made with a different method or cost
+
+        Returns:
+            bool: True if the hash should be regenerated on next login
+        """
+        return password_hash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,175 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+# Outcomes of IdempotencyStore.begin
+CLAIMED, REPLAY, IN_PROGRESS, MISMATCH = 'claimed', 'replay', 'in_progress', 'mismatch'
+
+
+class ClaimLost(Exception):
+    """
+    Raised when a request's claim on its key was taken over before its work
+    committed; the work must be rolled back
+    """
+
+
+class IdempotencyStore:
+    """
+    Remembers the first response to each idempotency key so that a retried
+    request gets the same answer instead of being executed again.
+
+    A request claims its key by inserting a pending row (status_code NULL)
+    in its own short transaction; the primary key makes concurrent retries
+    of the same request wait for the first one instead of racing it. The
+    pending row holds a lease, so a key whose worker died before doing any
+    work can be claimed again once the lease runs out.
+
+    The work itself marks the key done: mark_done() runs inside the route's
+    own transaction, so the work and a stand-in response commit together
+    and a retry can never repeat committed work, even if the worker dies
+    before complete() stores the real response. Each claim is identified by
+    the expires_at it last wrote, so a request whose lease was taken over
+    cannot commit (ClaimLost), complete or release the new owner's claim.
+    Completed rows are kept for `ttl` and removed by sweep(), which walks
+    the expires_at index.
+
+    Args:
+        ttl (timedelta): How long a stored response is replayed
+        lease (timedelta): How long a pending claim blocks retries
+        sweep_every (int): Claims between sweeps of expired rows
+    """
+
+    def __init__(self, ttl=timedelta(hours=24), lease=timedelta(seconds=30), sweep_every=1000):
+        self.ttl = ttl
+        self.lease = lease
+        self.sweep_every = sweep_every
+        self._claims = 0
+
+    @property
+    def table(self):
+        from models import IdempotencyKey
+        return IdempotencyKey.__table__
+
+    @staticmethod
+    def key_for(user_id, endpoint, client_key):
+        # Scoped to user and endpoint, so one client's keys can never replay another's responses
+        return hashlib.sha256(f'{user_id}:{endpoint}:{client_key}'.encode()).hexdigest()
+
+    @staticmethod
+    def fingerprint(path, params):
+        """
+        Digest of the request a key was first used with
+
+        Args:
+            path (str): Request path
+            params (list): (name, value) pairs of the request parameters
+        """
+        return hashlib.md5(json.dumps([path, sorted(params)]).encode()).hexdigest()
+
+    def begin(self, engine, key, fingerprint, now=None):
+        """
+        Claim a key, or find the response already stored for it
+
+        Returns:
+            tuple: (CLAIMED, claim), (REPLAY, row), (IN_PROGRESS, None) or (MISMATCH, None),
+                claim being the token to pass to mark_done(), complete() and release()
+        """
+        if now is None:
+            now = datetime.utcnow()
+        table = self.table
+
+        self._claims += 1
+        if self._claims % self.sweep_every == 0:
+            self.sweep(engine, now)
+
+        claim = now + self.lease
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(table).values(key=key, fingerprint=fingerprint, expires_at=claim))
+            return CLAIMED, claim
+        except IntegrityError:
+            pass
+
+        with engine.begin() as conn:
+            # Expired rows (an abandoned claim or a stale response) are taken over
+            taken = conn.execute(
+                update(table)
+                .where(table.c.key == key, table.c.expires_at < now)
+                .values(fingerprint=fingerprint, status_code=None, content_type=None, location=None,
+                        body=None, expires_at=claim)
+            ).rowcount
+            if taken:
+                return CLAIMED, claim
+
+            row = conn.execute(select(table).where(table.c.key == key)).first()
+
+        if row is None:
+            # Swept between the two statements
+            return self.begin(engine, key, fingerprint, now)
+        if row.fingerprint != fingerprint:
+            return MISMATCH, None
+        if row.status_code is None:
+            return IN_PROGRESS, None
+        return REPLAY, row
+
+    def _store(self, key, claim, response, now):
+        table = self.table
+        return update(table).where(table.c.key == key, table.c.expires_at == claim).values(
+            status_code=response.status_code,
+            content_type=response.content_type,
+            location=response.headers.get('Location'),
+            body=response.get_data(),
+            expires_at=now + self.ttl,
+        )
+
+    def mark_done(self, session, key, claim, response, now=None):
+        """
+        Store a stand-in response in the transaction doing the work, so both
+        commit or neither does
+
+        Returns:
+            datetime: The claim token from now on
+
+        Raises:
+            ClaimLost: If the claim was taken over (or already marked)
+        """
+        if now is None:
+            now = datetime.utcnow()
+        statement = self._store(key, claim, response, now).where(self.table.c.status_code.is_(None))
+        if session.execute(statement).rowcount != 1:
+            raise ClaimLost(key)
+        return now + self.ttl
+
+    def complete(self, engine, key, claim, response, now=None):
+        """
+        Store the response of a claimed key, replacing any stand-in
+        """
+        if now is None:
+            now = datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(self._store(key, claim, response, now))
+
+    def release(self, engine, key, claim):
+        """
+        Drop a claim whose request did no work, so the client can retry it
+        """
+        table = self.table
+        with engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.key == key, table.c.expires_at == claim,
+                                             table.c.status_code.is_(None)))
+
+    def sweep(self, engine, now=None):
+        """
+        Delete expired keys
+
+        Returns:
+            int: Number of rows deleted
+        """
+        if now is None:
+            now = datetime.utcnow()
+        table = self.table
+        with engine.begin() as conn:
+            return conn.execute(delete(table).where(table.c.expires_at < now)).rowcount
@@ -22,12 +22,17 @@ class User(db.Model):
 class ParkingSlot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     slot_number = db.Column(db.Integer, unique=True, nullable=False)
-    status = db.Column(db.String(20), default='Available')  # Available, Occupied
+    status = db.Column(db.String(20), default='Available')  # Available, Occupied, Maintenance
+    zone = db.Column(db.String(20), nullable=True, index=True)  # Level or zone name
     occupied_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     occupied_at = db.Column(db.DateTime, nullable=True)
     
     # Relationships
     qr_codes = db.relationship('QRCode', backref='slot', lazy=True)
+    reservations = db.relationship('Reservation', backref='slot', lazy=True)
+    
+    # Slot allocation looks up the first available slot
+    __table_args__ = (db.Index('ix_parking_slot_status', 'status', 'id'),)
     
     def __repr__(self):
         return f'<ParkingSlot {self.slot_number}>'
@@ -40,6 +45,9 @@ class Transaction(db.Model):
     description = db.Column(db.String(255))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Wallet page lists a user's latest transactions
+    __table_args__ = (db.Index('ix_transaction_user_time', 'user_id', 'timestamp'),)
+    
     def __repr__(self):
         return f'<Transaction {self.id}>'
 
@@ -54,6 +62,12 @@ class QRCode(db.Model):
     is_used = db.Column(db.Boolean, default=False)
     is_active = db.Column(db.Boolean, default=False)
     
+    # Active parking session lookup (user_id, type='entry', is_used, is_active) runs on most routes
+    __table_args__ = (
+        db.Index('ix_qr_code_session', 'user_id', 'type', 'is_used', 'is_active'),
+        db.Index('ix_qr_code_created', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<QRCode {self.id}>'
 
@@ -69,3 +83,73 @@ class Bill(db.Model):
     
     def __repr__(self):
         return f'<Bill {self.bill_number or self.barcode}>'
+
+# Archive tables (filled by retention.py, no foreign keys so hot rows can be dropped freely)
+class QRCodeArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    slot_id = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    is_used = db.Column(db.Boolean, default=False)
+    is_active = db.Column(db.Boolean, default=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<QRCodeArchive {self.id}>'
+
+class TransactionArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    amount = db.Column(db.Float, nullable=False)
+    type = db.Column(db.String(10), nullable=False)
+    description = db.Column(db.String(255))
+    timestamp = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<TransactionArchive {self.id}>'
+
+class Reservation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    slot_id = db.Column(db.Integer, db.ForeignKey('parking_slot.id'), nullable=False)
+    start_at = db.Column(db.DateTime, nullable=False)
+    end_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), default='Booked')  # Booked, Fulfilled, Cancelled
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_reservation_slot_window', 'slot_id', 'start_at', 'end_at'),
+        db.Index('ix_reservation_created', 'created_at'),  # Incremental index sync
+    )
+    
+    def __repr__(self):
+        return f'<Reservation {self.id}>'
+
+class GateEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.SmallInteger, nullable=False)  # 1 entry, 2 exit, 3 bill, 4 slot status (see events.py)
+    slot_id = db.Column(db.Integer, nullable=False, default=0)
+    user_id = db.Column(db.Integer, nullable=False, default=0)
+    ref = db.Column(db.Integer, nullable=False, default=0)  # Bill id or slot status code
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<GateEvent {self.id}>'
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_key'
+    
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of user, endpoint and client key
+    fingerprint = db.Column(db.String(32), nullable=False)  # md5 of path and parameters
+    status_code = db.Column(db.SmallInteger, nullable=True)  # NULL while the first request runs
+    content_type = db.Column(db.String(100), nullable=True)
+    location = db.Column(db.String(255), nullable=True)
+    body = db.Column(db.LargeBinary, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key[:12]}>'
@@ -0,0 +1,275 @@
+"""
+Replay a ParkEase traffic capture (see capture.py) against a local instance
+and compare latency distributions between two runs.
+
+    python replay.py run instance/capture --target http://localhost:5000 --speed 1 --out before.jsonl
+    python replay.py run instance/capture --speed max --concurrency 16 --out after.jsonl
+    python replay.py compare before.jsonl after.jsonl
+
+Every pseudonymous user in the capture is registered and logged in on the
+target before the clock starts. Ids returned by the target (QR codes,
+reservations) are substituted into later requests of the same user, so
+entry/exit flows replay end to end.
+
+Each replay user sends its own X-Forwarded-For address (the app trusts one
+proxy hop), so per-address rate limits and hashing limits see many clients,
+as in production, rather than one. compare reports each route separately per
+status class, so 429 rejections do not mix into the latency of real work.
+"""
+import re
+import sys
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+from http.cookiejar import CookieJar
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+REPLAY_PASSWORD = 'replay-password'
+RULE_ARGUMENT = re.compile(r'<(?:[^:>]+:)?([^>]+)>')
+
+# Ids handed out by one response and used in a later URL
+RESPONSE_IDS = ('qr_id', 'reservation_id')
+
+
+class NoRedirect(HTTPRedirectHandler):
+    # Measure the request itself, not the page it redirects to
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def replay_address(number):
+    # Stable 10.x.y.z address per replay client
+    number %= 254 ** 3
+    return f'10.{number // 254 ** 2 % 254 + 1}.{number // 254 % 254 + 1}.{number % 254 + 1}'
+
+
+class ReplayUser:
+    def __init__(self, target, pseudonym, is_admin=False, address=None):
+        self.target = target
+        self.pseudonym = pseudonym
+        self.is_admin = is_admin
+        self.address = address or replay_address(int(pseudonym, 16))
+        self.car_number = 'ADMIN001' if is_admin else f'R{pseudonym[:10].upper()}'
+        self.password = 'admin123' if is_admin else REPLAY_PASSWORD
+        self.ids = {}
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), NoRedirect)
+
+    def send(self, method, path, params=None):
+        data = urlencode(params or {}).encode() if method != 'GET' else None
+        request = Request(self.target + path, data=data, method=method, headers={'X-Forwarded-For': self.address})
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                return response.status, response.read()
+        except HTTPError as e:
+            return e.code, e.read()
+
+    def send_until_accepted(self, method, path, params, attempts=20):
+        # Provisioning runs many users at once, so back off on the hashing limits
+        for attempt in range(attempts):
+            status, body = self.send(method, path, params)
+            if status != 429:
+                return status
+            time.sleep(0.05 * (attempt + 1))
+        return status
+
+    def setup(self):
+        if self.is_admin:
+            self.send('GET', '/create_admin')
+        else:
+            mobile = str(int(self.pseudonym, 16) % 10 ** 10).zfill(10)
+            self.send_until_accepted('POST', '/register', {'name': f'Replay {self.pseudonym}', 'car_number': self.car_number,
+                                                           'mobile': mobile, 'password': self.password})
+        if self.send_until_accepted('POST', '/login', {'car_number': self.car_number, 'password': self.password}) != 302:
+            print(f'Could not log in replay user {self.pseudonym}', file=sys.stderr)
+
+
+def load_capture(directory):
+    records = []
+    for path in glob.glob(f'{directory}/capture-*.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda record: record['t'])
+    return records
+
+
+def build_request(record, user, number):
+    """
+    Turn a captured record into (method, path, params) for this user
+    """
+    params = dict(record['p'])
+    rule = record['r']
+
+    if rule == '/login' and user is not None:
+        params.update(car_number=user.car_number, password=user.password)
+    elif rule == '/login':
+        params.update(password='not-the-password')
+    elif rule == '/register':
+        # Fresh identity per replayed registration so it does real work
+        params.update(car_number=f'RN{number:011d}', mobile=f'8{number:011d}', password=REPLAY_PASSWORD)
+
+    def argument(match):
+        name = match.group(1)
+        if user is not None and name in user.ids:
+            return str(user.ids[name])
+        return str(record['a'].get(name, ''))
+
+    return record['m'], RULE_ARGUMENT.sub(argument, rule), params
+
+
+def run(args):
+    records = load_capture(args.capture)
+    if not records:
+        sys.exit('No capture files found.')
+
+    users = {}
+    for record in records:
+        if record.get('u') and record['u'] not in users:
+            users[record['u']] = ReplayUser(args.target, record['u'], bool(record.get('x')))
+
+    print(f'Provisioning {len(users)} users...')
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda user: user.setup(), users.values()))
+
+    anonymous = [ReplayUser(args.target, f'anon{i}', address=replay_address(10 ** 7 + i)) for i in range(args.concurrency)]
+    # Unique per run, so replaying twice against one database still registers new users
+    counter = [int(time.time()) % 10 ** 5 * 10 ** 6]
+    counter_lock = threading.Lock()
+
+    def next_number():
+        with counter_lock:
+            counter[0] += 1
+            return counter[0]
+
+    results = []
+    results_lock = threading.Lock()
+    queues = [queue.Queue() for _ in range(args.concurrency)]
+    speed = None if args.speed == 'max' else float(args.speed)
+    first_t = records[0]['t']
+
+    def worker(q):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            record, user, anon = item
+
+            if speed is not None:
+                due = start + (record['t'] - first_t) / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            method, path, params = build_request(record, user, next_number())
+            sent = time.monotonic()
+            try:
+                status, body = (user or anon).send(method, path, params)
+            except URLError as e:
+                status, body = 0, str(e).encode()
+            latency = (time.monotonic() - sent) * 1000
+
+            if user is not None and body[:1] == b'{':
+                try:
+                    payload = json.loads(body)
+                    user.ids.update({key: payload[key] for key in RESPONSE_IDS if key in payload})
+                except ValueError:
+                    pass
+
+            with results_lock:
+                results.append({'m': method, 'r': record['r'], 's': status, 'd': round(latency, 2),
+                                'lag': round((sent - start) * 1000 - (record['t'] - first_t) * 1000 / speed, 2)
+                                if speed else 0})
+
+    threads = [threading.Thread(target=worker, args=(q,), daemon=True) for q in queues]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+
+    # One queue per user keeps each user's requests in captured order; pseudonyms
+    # are hex digests, so the mapping is the same on every run (hash() is salted)
+    for i, record in enumerate(records):
+        user = users.get(record.get('u'))
+        index = int(user.pseudonym, 16) % len(queues) if user else i % len(queues)
+        queues[index].put((record, user, anonymous[index]))
+    for q in queues:
+        q.put(None)
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.monotonic() - start
+    with open(args.out, 'w', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps(result, separators=(',', ':')) + '\n')
+
+    print(f'Replayed {len(results)} requests in {elapsed:.1f}s ({len(results) / elapsed:.0f} req/s), results in {args.out}')
+
+
+def percentile(values, q):
+    return values[int(q * (len(values) - 1))] if values else 0.0
+
+
+def status_class(status):
+    if status == 429:
+        return '429'
+    return f'{status // 100}xx' if status else 'error'
+
+
+def load_results(path):
+    """
+    Latencies per route and status class, so rejected and failed requests
+    are compared among themselves and not against completed ones
+    """
+    by_route = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            result = json.loads(line)
+            key = (f"{result['m']} {result['r']}", status_class(result['s']))
+            by_route.setdefault(key, []).append(result['d'])
+    for latencies in by_route.values():
+        latencies.sort()
+    return by_route
+
+
+def compare(args):
+    before = load_results(args.before)
+    after = load_results(args.after)
+
+    print(f"{'route':<45} {'status':>6} {'n':>7} {'p50':>9} {'p95':>9} {'p99':>9}   (ms, after vs before)")
+    for route, status in sorted(set(before) | set(after)):
+        a, b = before.get((route, status), []), after.get((route, status), [])
+        cells = []
+        for q in (0.5, 0.95, 0.99):
+            old, new = percentile(a, q), percentile(b, q)
+            change = f'{(new - old) / old * 100:+.0f}%' if old else 'n/a'
+            cells.append(f'{new:7.1f} {change:>6}')
+        print(f'{route:<45} {status:>6} {len(b):>7} ' + ' '.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Replay a capture against a target')
+    run_parser.add_argument('capture', help='Capture directory')
+    run_parser.add_argument('--target', default='http://localhost:5000')
+    run_parser.add_argument('--speed', default='1', help='Time scale (1 = as captured, 10 = ten times faster) or "max"')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--out', default='replay-results.jsonl')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='Compare latency of two replay runs')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
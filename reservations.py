@@ -0,0 +1,401 @@
+import time
+import random
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+
+# Booking limits
+MAX_RESERVATION_HOURS = 24
+MAX_ADVANCE_DAYS = 30
+
+# Re-read bookings created this long before the newest one seen, so a
+# transaction that commits late (or out of id order) is still picked up
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def parse_utc(value):
+    """
+    Parse an ISO 8601 date-time as naive UTC, the form stored in the database
+
+    Raises:
+        ValueError: If the value is not an ISO date-time
+    """
+    if not value:
+        raise ValueError('Missing date-time.')
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class _GapNode:
+    __slots__ = ('key', 'end', 'priority', 'left', 'right', 'max_end')
+
+    def __init__(self, key, end):
+        self.key = key
+        self.end = end
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+
+def _pull(node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+    return node
+
+
+def _split(node, key, inclusive):
+    # Left part holds keys < key (<= key when inclusive), right part the rest
+    if node is None:
+        return None, None
+    if node.key < key or (inclusive and node.key == key):
+        node.right, right = _split(node.right, key, inclusive)
+        return _pull(node), right
+    left, node.left = _split(node.left, key, inclusive)
+    return left, _pull(node)
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _pull(left)
+    right.left = _merge(left, right.left)
+    return _pull(right)
+
+
+class _GapTree:
+    """
+    Free gaps of every slot, keyed by (gap start, slot id) in a treap whose
+    nodes also carry the latest gap end in their subtree.
+
+    A slot is free for [start, end) exactly when one of its gaps begins at or
+    before `start` and ends at or after `end`, so find() answers "any slot
+    free for this window" in O(log G) expected time for G gaps in total.
+    """
+
+    def __init__(self):
+        self._root = None
+
+    def insert(self, gap_start, slot_id, gap_end):
+        left, right = _split(self._root, (gap_start, slot_id), False)
+        self._root = _merge(_merge(left, _GapNode((gap_start, slot_id), gap_end)), right)
+
+    def delete(self, gap_start, slot_id):
+        left, rest = _split(self._root, (gap_start, slot_id), False)
+        _, right = _split(rest, (gap_start, slot_id), True)
+        self._root = _merge(left, right)
+
+    def find(self, start, end):
+        node = self._root
+        while node is not None:
+            if node.key[0] > start:
+                node = node.left
+                continue
+            # This node and its whole left subtree begin at or before `start`
+            if node.left is not None and node.left.max_end >= end:
+                node = node.left
+                while True:
+                    if node.left is not None and node.left.max_end >= end:
+                        node = node.left
+                    elif node.end >= end:
+                        return node.key[1]
+                    else:
+                        node = node.right
+            if node.end >= end:
+                return node.key[1]
+            node = node.right
+        return None
+
+
+class ReservationIndex:
+    """
+    Per-slot sorted interval index over booked reservations.
+
+    Bookings on one slot never overlap, so keeping their start times sorted
+    (with end times alongside) lets is_free() answer with a single bisect.
+    Slots with no bookings are not in the index at all and are free for
+    any window. Across slots, the free gaps between bookings of every
+    bookable slot are kept in a _GapTree, so find_free_slot() does not have
+    to visit each slot.
+
+    New bookings made by other workers are pulled in on every sync() by
+    created_at, re-reading an overlap window so transactions that commit
+    late or out of id order are not missed; a full reload every
+    `refresh_seconds` drops cancelled and expired ones. Bookings committed
+    after the last sync can still be missing, so book_slot() and
+    pick_walk_in_slot() re-check the chosen slot in the database.
+
+    Args:
+        refresh_seconds (float): Seconds between full reloads
+    """
+
+    def __init__(self, refresh_seconds=60):
+        self.refresh_seconds = refresh_seconds
+        self._slots = {}
+        self._ids = set()
+        self._bookable = set()
+        self._gaps = {}
+        self._tree = _GapTree()
+        self._watermark = None
+        self._loaded_at = None
+        self.lock = threading.RLock()
+
+    def _add(self, slot_id, start, end, reservation_id):
+        if reservation_id in self._ids:
+            return
+        self._ids.add(reservation_id)
+        starts, entries = self._slots.setdefault(slot_id, ([], []))
+        i = bisect_left(starts, start)
+        starts.insert(i, start)
+        entries.insert(i, (end, reservation_id))
+        self._index_gaps(slot_id)
+
+    def _index_gaps(self, slot_id):
+        # Re-derive one slot's gaps: O(k log G) for its k bookings
+        for gap_start in self._gaps.pop(slot_id, ()):
+            self._tree.delete(gap_start, slot_id)
+        if slot_id not in self._bookable:
+            return
+
+        gaps = []
+        free_from = datetime.min
+        starts, entries = self._slots.get(slot_id, ([], []))
+        for start, (end, _) in zip(starts, entries):
+            if start > free_from:
+                gaps.append((free_from, start))
+            free_from = max(free_from, end)
+        gaps.append((free_from, datetime.max))
+
+        for gap_start, gap_end in gaps:
+            self._tree.insert(gap_start, slot_id, gap_end)
+        self._gaps[slot_id] = [gap_start for gap_start, _ in gaps]
+
+    def invalidate(self):
+        """
+        Force a full reload on the next sync, e.g. after slots were added or
+        put under maintenance
+        """
+        with self.lock:
+            self._loaded_at = None
+
+    def sync(self, session):
+        """
+        Load bookings created since the last sync (or everything, when stale)
+        """
+        from models import ParkingSlot, Reservation
+
+        with self.lock:
+            now = time.monotonic()
+            query = Reservation.query.filter(Reservation.status == 'Booked', Reservation.end_at > datetime.utcnow())
+
+            if self._loaded_at is None or now - self._loaded_at > self.refresh_seconds:
+                self._slots = {}
+                self._ids = set()
+                self._gaps = {}
+                self._tree = _GapTree()
+                self._watermark = None
+                self._loaded_at = now
+                self._bookable = {slot_id for slot_id, in session.query(ParkingSlot.id)
+                                  .filter(ParkingSlot.status != 'Maintenance')}
+                for slot_id in self._bookable:
+                    self._index_gaps(slot_id)
+            elif self._watermark is not None:
+                query = query.filter(Reservation.created_at >= self._watermark - SYNC_OVERLAP)
+
+            for reservation in query.all():
+                self._add(reservation.slot_id, reservation.start_at, reservation.end_at, reservation.id)
+                # Only rows read from the database move the watermark
+                if self._watermark is None or reservation.created_at > self._watermark:
+                    self._watermark = reservation.created_at
+
+    def add(self, reservation):
+        with self.lock:
+            self._add(reservation.slot_id, reservation.start_at, reservation.end_at, reservation.id)
+
+    def remove(self, reservation):
+        with self.lock:
+            self._ids.discard(reservation.id)
+            starts, entries = self._slots.get(reservation.slot_id, ([], []))
+            for i in range(bisect_left(starts, reservation.start_at), len(starts)):
+                if entries[i][1] == reservation.id:
+                    del starts[i]
+                    del entries[i]
+                    break
+            if reservation.slot_id in self._slots and not starts:
+                del self._slots[reservation.slot_id]
+            self._index_gaps(reservation.slot_id)
+
+    def exclude(self, slot_id):
+        """
+        Stop offering a slot for bookings until the next full reload
+        """
+        with self.lock:
+            self._bookable.discard(slot_id)
+            self._index_gaps(slot_id)
+
+    def is_free(self, slot_id, start, end):
+        """
+        Check if a slot has no booking overlapping [start, end), in O(log n)
+        """
+        with self.lock:
+            if slot_id not in self._slots:
+                return True
+            starts, entries = self._slots[slot_id]
+            # The only candidate for overlap is the last booking starting before `end`
+            i = bisect_left(starts, end)
+            return i == 0 or entries[i - 1][0] <= start
+
+    def find_free_slot(self, start, end):
+        """
+        Get a bookable slot id that is free for [start, end), or None, in
+        O(log G) expected time for G free gaps across all slots
+        """
+        with self.lock:
+            return self._tree.find(start, end)
+
+
+def _lock_slot(session, slot_id):
+    """
+    Serialise bookings of one slot across workers until the transaction
+    ends, and get its current status
+
+    PostgreSQL locks the parking_slot row (SELECT ... FOR UPDATE). SQLite
+    has no row locks, so a no-op write takes the database write lock.
+    """
+    from models import ParkingSlot
+
+    table = ParkingSlot.__table__
+    if session.get_bind().dialect.name == 'sqlite':
+        session.execute(update(table).where(table.c.id == slot_id).values(status=table.c.status))
+    return session.execute(select(table.c.status).where(table.c.id == slot_id).with_for_update()).scalar()
+
+
+def book_slot(session, index, user_id, start, end):
+    """
+    Reserve any free slot for the window [start, end)
+
+    Returns:
+        Reservation: The new booking
+
+    Raises:
+        ValueError: If the window is invalid or no slot is free
+    """
+    from models import Reservation
+
+    now = datetime.utcnow()
+    if end <= start:
+        raise ValueError('Reservation must end after it starts.')
+    if start < now - timedelta(minutes=5):
+        raise ValueError('Reservation cannot start in the past.')
+    if end - start > timedelta(hours=MAX_RESERVATION_HOURS):
+        raise ValueError(f'Reservations are limited to {MAX_RESERVATION_HOURS} hours.')
+    if start > now + timedelta(days=MAX_ADVANCE_DAYS):
+        raise ValueError(f'Reservations can be made at most {MAX_ADVANCE_DAYS} days ahead.')
+
+    with index.lock:
+        index.sync(session)
+
+        while True:
+            slot_id = index.find_free_slot(start, end)
+            if slot_id is None:
+                raise ValueError('No parking slots available for the requested time.')
+
+            # Held until the booking commits, so no other worker can book an
+            # overlapping window on this slot between the check and the insert
+            status = _lock_slot(session, slot_id)
+
+            # The slot may have gone under maintenance since the last full reload
+            if status == 'Maintenance':
+                session.rollback()
+                index.exclude(slot_id)
+                continue
+
+            # Another worker may have booked it since our last sync
+            clash = find_clash(slot_id, start, end)
+            if clash is None:
+                break
+            index.add(clash)
+            # Release the lock before trying another slot, so workers never wait on each other's slots
+            session.rollback()
+
+        reservation = Reservation(user_id=user_id, slot_id=slot_id, start_at=start, end_at=end, status='Booked')
+        session.add(reservation)
+        session.commit()
+        index.add(reservation)
+
+    return reservation
+
+
+def find_clash(slot_id, start, end):
+    """
+    Get a committed booking on a slot overlapping [start, end), or None
+    """
+    from models import Reservation
+
+    return Reservation.query.filter(
+        Reservation.slot_id == slot_id,
+        Reservation.status == 'Booked',
+        Reservation.start_at < end,
+        Reservation.end_at > start
+    ).first()
+
+
+def claim_reservation(user_id, now, grace_minutes=15):
+    """
+    Get the user's booking that covers the current time, if any
+
+    Returns:
+        Reservation: Booking the user may enter on now, or None
+    """
+    from models import Reservation
+
+    return Reservation.query.filter(
+        Reservation.user_id == user_id,
+        Reservation.status == 'Booked',
+        Reservation.start_at <= now + timedelta(minutes=grace_minutes),
+        Reservation.end_at > now
+    ).order_by(Reservation.start_at).first()
+
+
+def pick_walk_in_slot(session, index, now, horizon_minutes=120, batch_size=100):
+    """
+    Get the first available slot without a booking in the next `horizon_minutes`
+
+    Returns:
+        ParkingSlot: Slot for a walk-in car, or None
+    """
+    from models import ParkingSlot
+
+    index.sync(session)
+    until = now + timedelta(minutes=horizon_minutes)
+    last_id = 0
+
+    while True:
+        candidates = ParkingSlot.query.filter(
+            ParkingSlot.status == 'Available', ParkingSlot.id > last_id
+        ).order_by(ParkingSlot.id).limit(batch_size).all()
+
+        if not candidates:
+            return None
+
+        for slot in candidates:
+            if not index.is_free(slot.id, now, until):
+                continue
+            # The index can miss bookings committed since the last sync
+            clash = find_clash(slot.id, now, until)
+            if clash is None:
+                return slot
+            index.add(clash)
+
+        last_id = candidates[-1].id
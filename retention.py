@@ -0,0 +1,154 @@
+import os
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, text
+from sqlalchemy.orm import Session
+
+# Default retention policy (overridable through app config, see app.py)
+RETENTION_DEFAULTS = {
+    'qr_days': 30,             # closed QR codes older than this are archived
+    'transaction_days': 365,   # transactions older than this are archived
+    'batch_size': 1000,        # rows moved per transaction
+    'mode': 'table',           # 'table' (archive tables) or 'file' (gzipped JSON lines)
+    'archive_dir': 'archive',  # target directory for 'file' mode
+    'compact': False,          # reclaim free pages after archiving
+}
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _database_size(engine):
+    """
+    Get the on-disk size of the database in bytes, or None if unknown
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            page_size = conn.execute(text('PRAGMA page_size')).scalar()
+            page_count = conn.execute(text('PRAGMA page_count')).scalar()
+            return page_size * page_count
+        if engine.dialect.name == 'postgresql':
+            return conn.execute(text('SELECT pg_database_size(current_database())')).scalar()
+    return None
+
+
+def _compact(engine, tables):
+    # VACUUM cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if engine.dialect.name == 'sqlite':
+            conn.execute(text('VACUUM'))
+        elif engine.dialect.name == 'postgresql':
+            quote = engine.dialect.identifier_preparer.quote
+            for table in tables:
+                conn.execute(text(f'VACUUM ANALYZE {quote(table.name)}'))
+
+
+def _archive_rows(session, table, archive_table, criteria, policy, now):
+    """
+    Move rows matching the criteria out of a hot table in batches
+
+    Returns:
+        dict: Rows moved and payload bytes moved for this table
+    """
+    moved = 0
+    payload_bytes = 0
+    out = None
+
+    if policy['mode'] == 'file':
+        os.makedirs(policy['archive_dir'], exist_ok=True)
+        path = os.path.join(policy['archive_dir'], f"{table.name}-{now.strftime('%Y%m%d%H%M%S')}.jsonl.gz")
+        out = gzip.open(path, 'at', encoding='utf-8')
+
+    try:
+        while True:
+            rows = session.execute(
+                select(table).where(*criteria).order_by(table.c.id).limit(policy['batch_size'])
+            ).mappings().all()
+
+            if not rows:
+                break
+
+            records = [dict(row) for row in rows]
+            lines = [json.dumps({k: _json_value(v) for k, v in record.items()}) for record in records]
+            payload_bytes += sum(len(line) for line in lines)
+
+            if out is not None:
+                out.write('\n'.join(lines) + '\n')
+                out.flush()
+            else:
+                session.execute(insert(archive_table), [dict(record, archived_at=now) for record in records])
+
+            session.execute(delete(table).where(table.c.id.in_([record['id'] for record in records])))
+            session.commit()
+            moved += len(records)
+            logging.debug(f"Archived {moved} rows from {table.name}")
+    finally:
+        if out is not None:
+            out.close()
+
+    return {'rows': moved, 'payload_bytes': payload_bytes}
+
+
+def run_retention(db, policy=None, now=None, engine=None):
+    """
+    Archive closed parking sessions' QR codes and old transactions
+
+    Args:
+        db (SQLAlchemy): Flask-SQLAlchemy instance
+        policy (dict, optional): Overrides for RETENTION_DEFAULTS
+        now (datetime, optional): Reference time. If None, current time is used.
+        engine (Engine, optional): Engine to run on instead of db.engine,
+            e.g. storage.maintenance_engine() without statement timeouts
+
+    Returns:
+        dict: Report with rows and bytes moved per table, database size before/after
+            and the bytes reclaimed between them
+    """
+    from models import QRCode, Transaction, QRCodeArchive, TransactionArchive
+
+    policy = {**RETENTION_DEFAULTS, **(policy or {})}
+    if now is None:
+        now = datetime.utcnow()
+
+    if engine is None:
+        engine = db.engine
+    qr_table = QRCode.__table__
+    transaction_table = Transaction.__table__
+    size_before = _database_size(engine)
+
+    with Session(engine) as session:
+        report = {
+            'mode': policy['mode'],
+            'qr_code': _archive_rows(
+                session, qr_table, QRCodeArchive.__table__,
+                # Active entry codes belong to cars still in the lot
+                [qr_table.c.is_active.is_not(True),
+                 qr_table.c.created_at < now - timedelta(days=policy['qr_days'])],
+                policy, now
+            ),
+            'transaction': _archive_rows(
+                session, transaction_table, TransactionArchive.__table__,
+                [transaction_table.c.timestamp < now - timedelta(days=policy['transaction_days'])],
+                policy, now
+            ),
+        }
+
+    if policy['compact']:
+        _compact(engine, [qr_table, transaction_table])
+
+    # Hot-table payload moved out (in 'table' mode it stays in the same
+    # database), and the space actually given back, which only shrinks in
+    # 'file' mode with compaction
+    report['payload_bytes_moved'] = report['qr_code']['payload_bytes'] + report['transaction']['payload_bytes']
+    report['db_bytes_before'] = size_before
+    report['db_bytes_after'] = _database_size(engine)
+    report['bytes_reclaimed'] = (size_before - report['db_bytes_after']
+                                 if size_before is not None and report['db_bytes_after'] is not None else None)
+
+    return report
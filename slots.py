@@ -0,0 +1,112 @@
+from sqlalchemy import select, insert, update
+
+from events import SLOT, STATUS_CODES
+
+# Statuses an admin may set directly (Occupied is only set by the entry flow)
+ADMIN_SLOT_STATUSES = ('Available', 'Maintenance')
+
+# Upper bound on slots touched by a single bulk request
+MAX_BULK_SLOTS = 10000
+
+
+def _check_range(first, last):
+    if first < 1 or last < first:
+        raise ValueError('Invalid slot range.')
+    if last - first + 1 > MAX_BULK_SLOTS:
+        raise ValueError(f'At most {MAX_BULK_SLOTS} slots can be changed at once.')
+
+
+def create_slot_range(session, first, last, zone=None, status='Available', event_log=None):
+    """
+    Create slots first..last (inclusive) in one transaction, skipping
+    slot numbers that already exist
+
+    Args:
+        session: SQLAlchemy session
+        first (int): First slot number
+        last (int): Last slot number
+        zone (str, optional): Zone or level name for the new slots
+        status (str): Initial status
+        event_log (EventLog, optional): Log a slot event for every new slot
+
+    Returns:
+        dict: Number of slots created and skipped
+    """
+    from models import ParkingSlot
+
+    _check_range(first, last)
+    if status not in ADMIN_SLOT_STATUSES:
+        raise ValueError('Invalid slot status.')
+
+    table = ParkingSlot.__table__
+    existing = set(session.execute(
+        select(table.c.slot_number).where(table.c.slot_number.between(first, last))
+    ).scalars())
+
+    rows = [
+        {'slot_number': number, 'status': status, 'zone': zone}
+        for number in range(first, last + 1) if number not in existing
+    ]
+
+    if rows:
+        ids = session.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+        if event_log is not None:
+            event_log.record_many(session, SLOT, [(slot_id, 0, STATUS_CODES[status]) for slot_id in ids])
+    session.commit()
+
+    return {'created': len(rows), 'skipped': len(existing)}
+
+
+def set_range_status(session, first, last, status, event_log=None):
+    """
+    Set the status of slots first..last (inclusive) with a single UPDATE.
+    Occupied slots are left alone so cars in the lot keep their slot.
+
+    Returns:
+        dict: Number of slots updated
+    """
+    from models import ParkingSlot
+
+    _check_range(first, last)
+    if status not in ADMIN_SLOT_STATUSES:
+        raise ValueError('Invalid slot status.')
+
+    table = ParkingSlot.__table__
+    ids = session.execute(
+        update(table)
+        .where(table.c.slot_number.between(first, last),
+               table.c.status.in_(ADMIN_SLOT_STATUSES),
+               table.c.status != status)
+        .values(status=status)
+        .returning(table.c.id)
+    ).scalars().all()
+    if event_log is not None:
+        event_log.record_many(session, SLOT, [(slot_id, 0, STATUS_CODES[status]) for slot_id in ids])
+    session.commit()
+
+    return {'updated': len(ids)}
+
+
+def set_zone_maintenance(session, zone, maintenance=True, event_log=None):
+    """
+    Put every free slot in a zone under maintenance, or release it again
+
+    Returns:
+        dict: Number of slots updated
+    """
+    from models import ParkingSlot
+
+    table = ParkingSlot.__table__
+    old_status, new_status = ('Available', 'Maintenance') if maintenance else ('Maintenance', 'Available')
+
+    ids = session.execute(
+        update(table)
+        .where(table.c.zone == zone, table.c.status == old_status)
+        .values(status=new_status)
+        .returning(table.c.id)
+    ).scalars().all()
+    if event_log is not None:
+        event_log.record_many(session, SLOT, [(slot_id, 0, STATUS_CODES[new_status]) for slot_id in ids])
+    session.commit()
+
+    return {'updated': len(ids)}
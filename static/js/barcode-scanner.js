@@ -1,11 +1,41 @@
 
-// Barcode Scanner implementation using ZXing and mediaDevices API
+// Barcode Scanner implementation using ZXing and mediaDevices API.
+// Frames are downscaled on the page and decoded in a Web Worker
+// (barcode-worker.js); a barcode is only accepted once it has been read in
+// several recent frames, so one scan sends one verification request.
 
 // Global variables
 let selectedDeviceId;
 let codeReader;
 let videoElement;
 
+// Decoding pipeline settings
+const SCAN_WIDTH = 640;       // Frames are scaled down to at most this width before decoding
+const SCAN_MAX_FPS = 15;      // Upper bound on frames sent to the decoder per second
+const VOTE_WINDOW = 5;        // Recent decoded frames considered when voting
+const VOTES_REQUIRED = 3;     // Matching reads within the window needed to accept a barcode
+
+let decoderWorker = null;
+let decoderReady = false;
+let scanning = false;
+let frameInFlight = false;
+let lastFrameAt = 0;
+let frameId = 0;
+let frameCanvas = null;
+let votes = [];
+
+// Pipeline counters, also available from the console as window.scanStats
+const scanStats = {
+    framesDecoded: 0,
+    decodeFps: 0,
+    decodeMs: 0,
+    serverCalls: 0,
+    successfulScans: 0,
+};
+window.scanStats = scanStats;
+let fpsWindowStart = 0;
+let fpsWindowFrames = 0;
+
 // Initialize the code reader when the DOM is loaded
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize the barcode scanner component if present on the page
@@ -31,29 +61,15 @@ async function initBarcodeScanner() {
         showError("Your browser doesn't support camera access. Please use the test mode below.");
         return;
     }
-    // added from here
-    try {
-        const devices = await ZXing.BrowserMultiFormatReader.listVideoInputDevices();
-        if (devices.length === 0) {
-            showError("No camera devices found.");
-            return;
-        }
-        selectedDeviceId = devices[0].deviceId;
-    } catch (err) {
-        console.error("Camera initialization failed:", err);
-        showError("Failed to access camera. Please check permissions.");
-    }
-    // added till here
 
     // Get reference to video element
     videoElement = document.getElementById('video');
     const startButton = document.getElementById('startScan');
     const stopButton = document.getElementById('stopScan');
-    const resultContainer = document.getElementById('scanResult');
     const deviceSelect = document.getElementById('cameraSelect');
     
     try {
-        // Create instance of BarcodeScanner
+        // Create instance of BarcodeScanner (used to list cameras, and to decode when Web Workers are unavailable)
         codeReader = new ZXing.BrowserMultiFormatReader();
         console.log('Created BrowserMultiFormatReader');
         
@@ -104,56 +120,35 @@ async function initBarcodeScanner() {
     console.log('Barcode scanner initialized successfully');
 }
 
-function startScan() {
-    // Get elements
-    // const startButton = document.getElementById('startScan');
-    // const stopButton = document.getElementById('stopScan');
-    // const resultContainer = document.getElementById('scanResult');
-    // const scannerContainer = document.getElementById('scanner-container');
-    
-    // // Reset previous result
-    // resultContainer.innerHTML = '';
-    // document.getElementById('barcodeValue').value = '';
-    
-    // // Show video and stop button, hide start button
-    // scannerContainer.classList.remove('d-none');
-    // startButton.classList.add('d-none');
-    // stopButton.classList.remove('d-none');
+function startDecoderWorker() {
+    if (decoderWorker || !window.Worker) {
+        return;
+    }
     
-    // // Start decoding from video device
-    // codeReader.decodeFromVideoDevice(selectedDeviceId, 'video', (result, err) => {
-    //     if (result) {
-    //         // We found a barcode
-    //         console.log('Found barcode:', result.getText());
-            
-    //         // Display result and stop scanner
-    //         const barcodeValue = result.getText();
-    //         document.getElementById('barcodeValue').value = barcodeValue;
-            
-    //         resultContainer.innerHTML = `
-    //             <div class="alert alert-success">
-    //                 <strong>Barcode Detected!</strong><br>
-    //                 <span>${barcodeValue}</span>
-    //             </div>
-    //             <button id="verifyBarcodeBtn" class="btn btn-primary">Verify Bill</button>
-    //         `;
-            
-    //         // Add verify button listener
-    //         document.getElementById('verifyBarcodeBtn').addEventListener('click', verifyBarcode);
-            
-    //         // Stop scanning
-    //         stopScan();
-    //     }
-        
-    //     if (err && !(err instanceof ZXing.NotFoundException)) {
-    //         console.error(err);
-    //         showError('Error during scanning: ' + err.message);
-    //     }
-    // }).catch((err) => {
-    //     console.error(err);
-    //     showError('Failed to start scanner: ' + err.message);
-    //     stopScan();
-    // });
+    const scanner = document.getElementById('barcode-scanner');
+    decoderWorker = new Worker(scanner.dataset.workerSrc);
+    decoderWorker.onmessage = (event) => {
+        const message = event.data;
+        if (message.type === 'ready') {
+            decoderReady = true;
+        } else if (message.type === 'result') {
+            frameInFlight = false;
+            recordDecodedFrame(message.decodeMs);
+            voteBarcode(message.text);
+        } else if (message.type === 'error') {
+            console.error('Decoder worker error:', message.message);
+            decoderWorker.terminate();
+            decoderWorker = null;
+            if (scanning) {
+                // Keep scanning with the main-thread decoder
+                startMainThreadDecoding();
+            }
+        }
+    };
+    decoderWorker.postMessage({ type: 'init', decoderSrc: scanner.dataset.decoderSrc });
+}
+
+async function startScan() {
     const startButton = document.getElementById('startScan');
     const stopButton = document.getElementById('stopScan');
     const resultContainer = document.getElementById('scanResult');
@@ -167,31 +162,46 @@ function startScan() {
     stopButton.classList.remove('d-none');
 
     console.log("Starting scan with device ID:", selectedDeviceId);
+    scanning = true;
+    frameInFlight = false;
+    votes = [];
 
-    codeReader.decodeFromVideoDevice(selectedDeviceId, 'video', (result, err) => {
-        if (result) {
-            const barcodeValue = result.getText();
-            console.log('Barcode detected:', barcodeValue);
-            document.getElementById('barcodeValue').value = barcodeValue;
+    startDecoderWorker();
+    if (!decoderWorker) {
+        startMainThreadDecoding();
+        return;
+    }
 
-            resultContainer.innerHTML = `
-                <div class="alert alert-success">
-                    <strong>Barcode Detected!</strong><br>
-                    <span>${barcodeValue}</span>
-                </div>
-                <button id="verifyBarcodeBtn" class="btn btn-primary mt-2">Verify Bill</button>
-            `;
+    try {
+        videoElement.srcObject = await navigator.mediaDevices.getUserMedia({
+            video: selectedDeviceId ? { deviceId: { exact: selectedDeviceId } } : { facingMode: 'environment' }
+        });
+        await videoElement.play();
+    } catch (err) {
+        console.error('Start scanner error:', err);
+        showError('Scanner error: ' + err.message);
+        stopScan();
+        return;
+    }
 
-            document.getElementById('verifyBarcodeBtn').addEventListener('click', () => {
-                verifyBarcode(barcodeValue);
-            });
+    scheduleFrame();
+}
 
-            stopScan(); // Optional: stop after detection
+function startMainThreadDecoding() {
+    // The reader opens its own stream
+    if (videoElement.srcObject) {
+        videoElement.srcObject.getTracks().forEach(track => track.stop());
+        videoElement.srcObject = null;
+    }
+    codeReader.decodeFromVideoDevice(selectedDeviceId, 'video', (result, err) => {
+        if (!scanning) {
+            return;
         }
+        recordDecodedFrame(0);
+        voteBarcode(result ? result.getText() : null);
 
         if (err && !(err instanceof ZXing.NotFoundException)) {
             console.error(err);
-            showError('Error during scanning: ' + err.message);
         }
     }).catch((err) => {
         console.error('Start scanner error:', err);
@@ -199,23 +209,128 @@ function startScan() {
     });
 }
 
-function stopScan() {
-    // const startButton = document.getElementById('startScan');
-    // const stopButton = document.getElementById('stopScan');
+function scheduleFrame() {
+    if (!scanning || !decoderWorker) {
+        return;
+    }
+    if (videoElement.requestVideoFrameCallback) {
+        videoElement.requestVideoFrameCallback(captureFrame);
+    } else {
+        requestAnimationFrame(captureFrame);
+    }
+}
+
+function captureFrame() {
+    if (!scanning || !decoderWorker) {
+        return;
+    }
+    
+    // Drop frames while the decoder is busy instead of queueing them
+    const now = performance.now();
+    if (!decoderReady || frameInFlight || now - lastFrameAt < 1000 / SCAN_MAX_FPS ||
+        videoElement.readyState < 2 || !videoElement.videoWidth) {
+        scheduleFrame();
+        return;
+    }
+    frameInFlight = true;
+    lastFrameAt = now;
+    
+    // Only the band behind the on-screen scan region, scaled down
+    const sourceWidth = videoElement.videoWidth * 0.8;
+    const sourceHeight = Math.min(videoElement.videoHeight, sourceWidth / 2);
+    const sourceX = (videoElement.videoWidth - sourceWidth) / 2;
+    const sourceY = (videoElement.videoHeight - sourceHeight) / 2;
+    const width = Math.round(Math.min(SCAN_WIDTH, sourceWidth));
+    const height = Math.round(sourceHeight * width / sourceWidth);
+    const id = ++frameId;
+    
+    if (window.createImageBitmap && typeof OffscreenCanvas !== 'undefined') {
+        // Scaling happens off the main thread, and the bitmap is moved, not copied
+        createImageBitmap(videoElement, sourceX, sourceY, sourceWidth, sourceHeight,
+                          { resizeWidth: width, resizeHeight: height, resizeQuality: 'low' })
+        .then(bitmap => {
+            decoderWorker.postMessage({ type: 'frame', id: id, bitmap: bitmap }, [bitmap]);
+        })
+        .catch(() => {
+            frameInFlight = false;
+        });
+    } else {
+        if (!frameCanvas) {
+            frameCanvas = document.createElement('canvas');
+        }
+        frameCanvas.width = width;
+        frameCanvas.height = height;
+        const context = frameCanvas.getContext('2d', { willReadFrequently: true });
+        context.drawImage(videoElement, sourceX, sourceY, sourceWidth, sourceHeight, 0, 0, width, height);
+        const pixels = context.getImageData(0, 0, width, height).data;
+        decoderWorker.postMessage({ type: 'frame', id: id, width: width, height: height, buffer: pixels.buffer },
+                                  [pixels.buffer]);
+    }
+    
+    scheduleFrame();
+}
+
+function recordDecodedFrame(decodeMs) {
+    const now = performance.now();
+    scanStats.framesDecoded++;
+    scanStats.decodeMs = Math.round(decodeMs * 10) / 10;
+    fpsWindowFrames++;
+    
+    if (now - fpsWindowStart >= 1000) {
+        scanStats.decodeFps = Math.round(fpsWindowFrames * 10000 / (now - fpsWindowStart)) / 10;
+        fpsWindowStart = now;
+        fpsWindowFrames = 0;
+        showScanStats();
+    }
+}
+
+function voteBarcode(text) {
+    if (!scanning) {
+        return;
+    }
+    
+    // A frame without a read still counts, so one stray misread cannot win
+    votes.push(text);
+    if (votes.length > VOTE_WINDOW) {
+        votes.shift();
+    }
+    if (!text || votes.filter(vote => vote === text).length < VOTES_REQUIRED) {
+        return;
+    }
     
-    // // Show start button, hide stop button
-    // startButton.classList.remove('d-none');
-    // stopButton.classList.add('d-none');
+    console.log('Barcode detected:', text);
+    stopScan();
     
-    // // Reset video stream
-    // if (codeReader) {
-    //     codeReader.reset();
-    // }
+    document.getElementById('barcodeValue').value = text;
+    document.getElementById('scanResult').innerHTML = `
+        <div class="alert alert-success">
+            <strong>Barcode Detected!</strong><br>
+            <span>${text}</span>
+        </div>
+    `;
+    verifyBarcode();
+}
+
+function showScanStats() {
+    const statsElement = document.getElementById('scanStats');
+    if (!statsElement) {
+        return;
+    }
+    const callsPerScan = scanStats.successfulScans ?
+        (scanStats.serverCalls / scanStats.successfulScans).toFixed(2) : '-';
+    statsElement.textContent = `Decoding ${scanStats.decodeFps} fps (${scanStats.decodeMs} ms/frame) · ` +
+                               `${callsPerScan} server calls per successful scan`;
+}
+
+function stopScan() {
     const startButton = document.getElementById('startScan');
     const stopButton = document.getElementById('stopScan');
+    const scannerContainer = document.getElementById('scanner-container');
 
+    scanning = false;
     startButton.classList.remove('d-none');
     stopButton.classList.add('d-none');
+    scannerContainer.classList.add('d-none');
 
     if (codeReader) {
         codeReader.reset();
@@ -270,6 +385,7 @@ function verifyBarcode() {
     formData.append('barcode', barcodeValue);
     
     // First, let's process directly to mark the bill as used and generate exit QR
+    scanStats.serverCalls++;
     fetch('/verify_bill', {
         method: 'POST',
         body: formData
@@ -283,6 +399,8 @@ function verifyBarcode() {
         
         if (processData.success) {
             // Successfully processed the bill
+            scanStats.successfulScans++;
+            showScanStats();
             const isFreeExit = processData.free_exit;
             
             let alertClass = isFreeExit ? 'success' : 'info';
@@ -351,6 +469,7 @@ function verifyBarcodeOnly() {
     formData.append('barcode', barcodeValue);
     
     // Make API request to verify without processing
+    scanStats.serverCalls++;
     fetch('/bill/verify_bill', {
         method: 'POST',
         body: formData
@@ -364,6 +483,8 @@ function verifyBarcodeOnly() {
         
         if (data.success) {
             // If bill is valid, show details
+            scanStats.successfulScans++;
+            showScanStats();
             let freeExitClass = data.bill.free_exit ? 'success' : 'warning';
             let freeExitText = data.bill.free_exit ? 'You qualify for free exit!' : 'Bill does not qualify for free exit.';
             
@@ -393,6 +514,7 @@ function verifyBarcodeOnly() {
                     </div>
                 `;
                 
+                scanStats.serverCalls++;
                 fetch('/verify_bill', {
                     method: 'POST',
                     body: processFormData
@@ -0,0 +1,89 @@
+// Barcode decoding worker: keeps ZXing off the main thread so the camera
+// preview and page stay responsive on low-end gate tablets.
+//
+// Messages in:
+//   {type: 'init', decoderSrc}                     load ZXing from decoderSrc
+//   {type: 'frame', id, bitmap}                    ImageBitmap (transferred)
+//   {type: 'frame', id, width, height, buffer}     RGBA pixels (transferred)
+// Messages out:
+//   {type: 'ready'} / {type: 'error', message}
+//   {type: 'result', id, text, format, decodeMs}   text is null when no barcode was found
+
+let reader = null;
+let hints = null;
+let canvas = null;
+let context = null;
+let luminance = new Uint8ClampedArray(0);
+
+self.onmessage = function(event) {
+    const message = event.data;
+    if (message.type === 'init') {
+        init(message.decoderSrc);
+    } else if (message.type === 'frame') {
+        decodeFrame(message);
+    }
+};
+
+function init(decoderSrc) {
+    try {
+        importScripts(decoderSrc);
+
+        hints = new Map();
+        hints.set(ZXing.DecodeHintType.POSSIBLE_FORMATS, [
+            ZXing.BarcodeFormat.CODE_128,
+            ZXing.BarcodeFormat.EAN_13,
+            ZXing.BarcodeFormat.EAN_8,
+            ZXing.BarcodeFormat.UPC_A,
+        ]);
+        reader = new ZXing.MultiFormatReader();
+        reader.setHints(hints);
+
+        self.postMessage({ type: 'ready' });
+    } catch (err) {
+        self.postMessage({ type: 'error', message: err.message || String(err) });
+    }
+}
+
+function pixelsFromBitmap(bitmap) {
+    if (!canvas || canvas.width !== bitmap.width || canvas.height !== bitmap.height) {
+        canvas = new OffscreenCanvas(bitmap.width, bitmap.height);
+        context = canvas.getContext('2d', { willReadFrequently: true });
+    }
+    context.drawImage(bitmap, 0, 0);
+    bitmap.close();
+    return context.getImageData(0, 0, canvas.width, canvas.height).data;
+}
+
+function toLuminance(rgba, size) {
+    // Integer approximation of 0.299 R + 0.587 G + 0.114 B
+    if (luminance.length !== size) {
+        luminance = new Uint8ClampedArray(size);
+    }
+    for (let i = 0, j = 0; i < size; i++, j += 4) {
+        luminance[i] = (rgba[j] * 77 + rgba[j + 1] * 150 + rgba[j + 2] * 29) >> 8;
+    }
+    return luminance;
+}
+
+function decodeFrame(message) {
+    const started = performance.now();
+    const width = message.bitmap ? message.bitmap.width : message.width;
+    const height = message.bitmap ? message.bitmap.height : message.height;
+    const rgba = message.bitmap ? pixelsFromBitmap(message.bitmap) : new Uint8ClampedArray(message.buffer);
+
+    let text = null;
+    let format = null;
+    try {
+        const source = new ZXing.RGBLuminanceSource(toLuminance(rgba, width * height), width, height);
+        const result = reader.decodeWithState(new ZXing.BinaryBitmap(new ZXing.HybridBinarizer(source)));
+        text = result.getText();
+        format = ZXing.BarcodeFormat[result.getBarcodeFormat()];
+    } catch (err) {
+        // NotFound, checksum and format errors just mean no barcode in this frame
+    } finally {
+        reader.reset();
+    }
+
+    self.postMessage({ type: 'result', id: message.id, text: text, format: format,
+                       decodeMs: performance.now() - started });
+}
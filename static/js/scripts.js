@@ -11,59 +11,6 @@ document.addEventListener('DOMContentLoaded', function() {
             }, 5000); // Auto dismiss after 5 seconds
         });
     }, 500);
-    //added from here
-    const startScannerBtn = document.getElementById('startScannerBtn');
-if (startScannerBtn) {
-    startScannerBtn.addEventListener('click', () => {
-        const scannerContainer = document.getElementById('barcodeScanner');
-        const resultDiv = document.getElementById('cameraResult');
-
-        if (Quagga.initialized) {
-            Quagga.stop();
-            Quagga.initialized = false;
-            startScannerBtn.textContent = "Scan Barcode with Camera";
-            return;
-        }
-
-        Quagga.init({
-            inputStream: {
-                name: "Live",
-                type: "LiveStream",
-                target: scannerContainer,
-                constraints: {
-                    facingMode: "environment" // Rear camera
-                }
-            },
-            decoder: {
-                readers: ["code_128_reader", "ean_reader", "ean_8_reader", "upc_reader"]
-            }
-        }, function(err) {
-            if (err) {
-                console.error(err);
-                resultDiv.innerHTML = '<div class="alert alert-danger">Failed to start scanner.</div>';
-                return;
-            }
-            Quagga.start();
-            Quagga.initialized = true;
-            startScannerBtn.textContent = "Stop Scanner";
-        });
-
-        Quagga.onDetected(data => {
-            const barcode = data.codeResult.code;
-            resultDiv.innerHTML = `<div class="alert alert-info">Scanned: ${barcode}</div>`;
-
-            // Auto fill barcode input and trigger verify
-            document.getElementById('barcodeInput').value = barcode;
-            document.getElementById('verifyBarcodeBtn').click();
-
-            // Stop scanner
-            Quagga.stop();
-            Quagga.initialized = false;
-            startScannerBtn.textContent = "Scan Barcode with Camera";
-        });
-    });
-}
-    //added till here
 
     // Entry QR generation
     const generateEntryQRBtn = document.getElementById('generateEntryQRBtn');
@@ -92,6 +39,19 @@ if (startScannerBtn) {
     }
 });
 
+// Idempotency keys for QR requests. A key is kept when the request fails on the
+// network, so pressing Retry returns the original QR instead of allocating a
+// second slot or charging twice, and dropped once the server has answered.
+let entryQRKey = null;
+let exitQRKey = null;
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+}
+
 // Generate entry QR code
 function generateEntryQR() {
     // Show loading spinner
@@ -102,14 +62,23 @@ function generateEntryQR() {
     const generateBtn = document.getElementById('generateEntryQRBtn');
     generateBtn.disabled = true;
     
+    entryQRKey = entryQRKey || newIdempotencyKey();
+    
     // Make API request
     fetch('/generate_entry_qr', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
+            'Idempotency-Key': entryQRKey,
         }
     })
-    .then(response => response.json())
+    .then(response => {
+        // 409: the first attempt is still running, so retry with the same key
+        if (response.status !== 409) {
+            entryQRKey = null;
+        }
+        return response.json();
+    })
     .then(data => {
         if (data.success) {
             // Display QR code
@@ -186,12 +155,23 @@ function generateExitQR() {
     formData.append('is_free_exit', isFreeExit);
     formData.append('charges', charges);
     
+    exitQRKey = exitQRKey || newIdempotencyKey();
+    
     // Make API request
     fetch('/generate_exit_qr', {
         method: 'POST',
+        headers: {
+            'Idempotency-Key': exitQRKey,
+        },
         body: formData
     })
-    .then(response => response.json())
+    .then(response => {
+        // 409: the first attempt is still running, so retry with the same key
+        if (response.status !== 409) {
+            exitQRKey = null;
+        }
+        return response.json();
+    })
     .then(data => {
         if (data.success) {
             // Display QR code
@@ -279,18 +259,17 @@ function updateParkingStatus() {
     
     if (!statusContainer) return;
     
-    // In a real application, we would fetch the latest status from the server
-    // For now, this is just a placeholder
-    
-    // Count available and occupied slots
-    const availableSlots = document.querySelectorAll('.slot-available').length;
-    const occupiedSlots = document.querySelectorAll('.slot-occupied').length;
-    
-    // Update the status
-    const totalSlots = availableSlots + occupiedSlots;
-    document.getElementById('totalSlots').textContent = totalSlots;
-    document.getElementById('availableSlots').textContent = availableSlots;
-    document.getElementById('occupiedSlots').textContent = occupiedSlots;
+    // The browser revalidates with the cached ETag, so unchanged counts come back as 304
+    fetch('/api/status', { cache: 'no-cache' })
+    .then(response => response.json())
+    .then(status => {
+        document.getElementById('totalSlots').textContent = status.total;
+        document.getElementById('availableSlots').textContent = status.available;
+        document.getElementById('occupiedSlots').textContent = status.occupied;
+    })
+    .catch(error => {
+        console.error('Status update error:', error);
+    });
 }
 
 // Call updateParkingStatus when page loads
@@ -0,0 +1,100 @@
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+
+from sqlalchemy import func
+
+
+class SlotStatusCounter:
+    """
+    In-memory slot counts for the public status API.
+
+    Routes that change a slot's status call transition() after committing, so
+    this worker sees its own changes immediately. Changes made by other
+    workers are picked up when the cached snapshot is older than `ttl`
+    seconds, which costs one GROUP BY query per worker per ttl no matter how
+    many kiosks are polling.
+
+    Args:
+        ttl (float): Seconds before counts are re-read from the database
+    """
+
+    def __init__(self, ttl=2.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counts = None
+        self._loaded_at = 0.0
+        self._last_modified = None
+        self._snapshot = None
+
+    def _query(self, session):
+        from models import ParkingSlot
+
+        rows = session.query(ParkingSlot.status, func.count(ParkingSlot.id)).group_by(ParkingSlot.status).all()
+        return {status: count for status, count in rows}
+
+    def _build_snapshot(self):
+        counts = self._counts
+        body = json.dumps({
+            'total': sum(counts.values()),
+            'available': counts.get('Available', 0),
+            'occupied': counts.get('Occupied', 0),
+            'maintenance': counts.get('Maintenance', 0),
+        })
+
+        # Derived from the counts only, so every worker hands out the same ETag
+        self._snapshot = {
+            'body': body,
+            'etag': hashlib.md5(body.encode()).hexdigest()[:16],
+            'last_modified': self._last_modified,
+        }
+
+    def _set_counts(self, counts):
+        if counts != self._counts:
+            self._counts = counts
+            self._last_modified = datetime.utcnow().replace(microsecond=0)
+        self._build_snapshot()
+
+    def snapshot(self, session):
+        """
+        Get the cached status, refreshing from the database when stale
+
+        Returns:
+            dict: JSON body, ETag and last modified time
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is None or now - self._loaded_at > self.ttl:
+                self._set_counts(self._query(session))
+                self._loaded_at = now
+            return self._snapshot
+
+    def transition(self, old_status, new_status):
+        """
+        Record a committed slot status change made by this worker
+        """
+        with self._lock:
+            if self._counts is None:
+                return
+            counts = dict(self._counts)
+            counts[old_status] = counts.get(old_status, 0) - 1
+            counts[new_status] = counts.get(new_status, 0) + 1
+            self._set_counts(counts)
+
+    def seed(self, counts):
+        """
+        Start from counts rebuilt elsewhere (the gate event log) instead of
+        querying the database on the first snapshot
+        """
+        with self._lock:
+            self._set_counts(counts)
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """
+        Force the next snapshot() to re-read counts from the database
+        """
+        with self._lock:
+            self._snapshot = None
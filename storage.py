@@ -0,0 +1,220 @@
+import os
+import time
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert, inspect, select, update
+from sqlalchemy.pool import NullPool
+
+# Storage profiles, selected with STORAGE_PROFILE (default: from the database URL)
+STORAGE_PROFILES = {
+    'sqlite': {
+        # WAL lets readers run alongside the single writer, NORMAL only fsyncs at checkpoints
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -20000,
+            'temp_store': 'MEMORY',
+        },
+    },
+    'postgresql': {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        'statement_timeout_ms': 5000,
+        'lock_timeout_ms': 2000,
+        'idle_in_transaction_timeout_ms': 60000,
+    },
+    # Previous behaviour, kept for comparison
+    'legacy': {},
+}
+
+
+def detect_profile(database_uri):
+    if database_uri.startswith('sqlite'):
+        return 'sqlite'
+    if database_uri.startswith('postgres'):
+        return 'postgresql'
+    return 'legacy'
+
+
+def engine_options(profile, overrides=None):
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS for a storage profile
+
+    Args:
+        profile (str): Profile name from STORAGE_PROFILES
+        overrides (dict, optional): Values replacing the profile defaults
+
+    Returns:
+        dict: Keyword arguments for create_engine
+    """
+    settings = {**STORAGE_PROFILES[profile], **(overrides or {})}
+
+    if profile == 'sqlite':
+        # A local file cannot go stale, so skip the pre-ping round trip
+        return {'connect_args': {'timeout': settings['pragmas']['busy_timeout'] / 1000}}
+
+    if profile == 'postgresql':
+        options = ' '.join([
+            f"-c statement_timeout={settings['statement_timeout_ms']}",
+            f"-c lock_timeout={settings['lock_timeout_ms']}",
+            f"-c idle_in_transaction_session_timeout={settings['idle_in_transaction_timeout_ms']}",
+        ])
+        # pool_recycle replaces pool_pre_ping: no extra round trip per checkout
+        return {
+            'pool_size': settings['pool_size'],
+            'max_overflow': settings['max_overflow'],
+            'pool_timeout': settings['pool_timeout'],
+            'pool_recycle': settings['pool_recycle'],
+            'connect_args': {'options': options, 'application_name': 'parkease'},
+        }
+
+    return {'pool_recycle': 300, 'pool_pre_ping': True}
+
+
+def configure_engine(engine, profile, overrides=None):
+    """
+    Apply per-connection settings (SQLite pragmas) to an engine
+    """
+    if profile != 'sqlite':
+        return
+
+    pragmas = {**STORAGE_PROFILES['sqlite'], **(overrides or {})}['pragmas']
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def maintenance_engine(url, profile):
+    """
+    Engine for long-running maintenance from the CLI (archiving, VACUUM).
+    It uses the profile's settings without the statement and idle-in-
+    transaction timeouts, which are sized for gate requests and would
+    cancel large batched deletes or a VACUUM; the lock timeout is kept so
+    maintenance gives way to gate traffic instead of queueing it.
+
+    Args:
+        url (str): Database URL
+        profile (str): Profile name from STORAGE_PROFILES
+
+    Returns:
+        Engine: Engine without a connection pool; dispose() it when done
+    """
+    options = engine_options(profile, {'statement_timeout_ms': 0, 'idle_in_transaction_timeout_ms': 0}
+                             if profile == 'postgresql' else None)
+    for name in ('pool_size', 'max_overflow', 'pool_timeout'):
+        options.pop(name, None)
+
+    engine = create_engine(url, poolclass=NullPool, **options)
+    configure_engine(engine, profile)
+    return engine
+
+
+def _gate_workload(engine, metadata, threads, operations, slots):
+    """
+    Run entry/exit style write transactions plus active-session reads
+    from several threads at once
+
+    Returns:
+        dict: Throughput, latency percentiles and failed transactions
+    """
+    slot_table = metadata.tables['parking_slot']
+    qr_table = metadata.tables['qr_code']
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        local = []
+        for i in range(operations):
+            slot_id = (worker_id * operations + i) % slots + 1
+            user_id = worker_id + 1
+            now = datetime.utcnow()
+            start = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    conn.execute(select(qr_table.c.id).where(
+                        qr_table.c.user_id == user_id, qr_table.c.type == 'entry',
+                        qr_table.c.is_used.is_(True), qr_table.c.is_active.is_(True)
+                    )).first()
+                    conn.execute(update(slot_table).where(slot_table.c.id == slot_id)
+                                 .values(status='Occupied' if i % 2 == 0 else 'Available'))
+                    conn.execute(insert(qr_table).values(
+                        user_id=user_id, slot_id=slot_id, type='entry', data='{}', created_at=now,
+                        expires_at=now + timedelta(minutes=10), is_used=True, is_active=i % 2 == 0
+                    ))
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pick = lambda q: round(latencies[int(q * (len(latencies) - 1))] * 1000, 2) if latencies else None
+    return {
+        'tx_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': pick(0.5),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'failed': errors[0],
+    }
+
+
+def benchmark_profiles(metadata, postgres_url=None, threads=8, operations=200, slots=500):
+    """
+    Compare the gate write workload across storage profiles on scratch databases
+
+    Args:
+        metadata (MetaData): Application table metadata
+        postgres_url (str, optional): Empty scratch PostgreSQL database to include
+            (tables are created and dropped again)
+
+    Returns:
+        dict: Workload results per profile
+    """
+    runs = [('sqlite (legacy)', 'legacy'), ('sqlite (tuned)', 'sqlite')]
+    if postgres_url:
+        runs += [('postgresql (legacy)', 'legacy'), ('postgresql (tuned)', 'postgresql')]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        for label, profile in runs:
+            if label.startswith('sqlite'):
+                url = f"sqlite:///{os.path.join(scratch, profile + '.db')}"
+            else:
+                url = postgres_url
+
+            engine = create_engine(url, **engine_options(profile))
+            configure_engine(engine, profile)
+            if inspect(engine).has_table('parking_slot'):
+                raise ValueError(f'{label}: benchmark needs an empty scratch database.')
+            metadata.create_all(engine)
+            with engine.begin() as conn:
+                conn.execute(insert(metadata.tables['parking_slot']),
+                             [{'slot_number': n, 'status': 'Available'} for n in range(1, slots + 1)])
+
+            results[label] = _gate_workload(engine, metadata, threads, operations, slots)
+            if not label.startswith('sqlite'):
+                metadata.drop_all(engine)
+            engine.dispose()
+
+    return results
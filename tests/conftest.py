@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app configures itself from the environment at import time, so point
+# every database and state file at a scratch directory first. Assigned
+# unconditionally: the fixtures create and delete rows, so an exported
+# DATABASE_URL must never reach the suite
+_scratch = tempfile.mkdtemp(prefix='parkease-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_scratch, 'test.db')}"
+os.environ['RATE_LIMIT_DB'] = os.path.join(_scratch, 'ratelimit.db')
+os.environ['FRAGMENT_CACHE_DB'] = os.path.join(_scratch, 'fragments.db')
+os.environ['EVENT_LOG_DIR'] = os.path.join(_scratch, 'events')
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
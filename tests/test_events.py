@@ -0,0 +1,95 @@
+import glob
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from events import EventLog, ENTRY, EXIT, RECORD, SLOT, STATUS_CODES, occupancy_counts
+
+
+def test_snapshot_includes_events_appended_late(app, tmp_path):
+    from models import GateEvent
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}")
+    GateEvent.__table__.create(engine)
+    log = EventLog(str(tmp_path / 'log'), snapshot_every=1000, settle_seconds=60)
+    log.bind(engine)
+
+    settled = datetime.utcnow() - timedelta(minutes=5)
+    records = [(1, ENTRY, 1, 7, 0), (2, ENTRY, 2, 8, 0), (3, EXIT, 1, 0, 0), (4, ENTRY, 3, 9, 0)]
+    with engine.begin() as conn:
+        conn.execute(insert(GateEvent.__table__), [
+            {'id': seq, 'kind': kind, 'slot_id': slot_id, 'user_id': user_id, 'ref': ref, 'created_at': settled}
+            for seq, kind, slot_id, user_id, ref in records
+        ])
+
+    # Event 2 committed, but its worker has not appended it to the file yet
+    ts = settled.timestamp()
+    log.append([(seq, kind, slot_id, user_id, ref, ts) for seq, kind, slot_id, user_id, ref in records if seq != 2],
+               snapshot=False)
+    assert log.snapshot() == 4
+
+    # The late append lands below the snapshot and is skipped by rebuild()
+    log.append([(2, ENTRY, 2, 8, 0, ts)], snapshot=False)
+    seq, occupancy = log.rebuild()
+    assert seq == 4
+    assert occupancy == {1: (0, 0), 2: (1, 8), 3: (1, 9)}
+
+
+def test_snapshot_skips_unsettled_events(app, tmp_path):
+    from models import GateEvent
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}")
+    GateEvent.__table__.create(engine)
+    log = EventLog(str(tmp_path / 'log'), settle_seconds=60)
+    log.bind(engine)
+
+    with engine.begin() as conn:
+        conn.execute(insert(GateEvent.__table__), [
+            {'id': 1, 'kind': SLOT, 'slot_id': 1, 'user_id': 0, 'ref': STATUS_CODES['Maintenance'],
+             'created_at': datetime.utcnow() - timedelta(minutes=5)},
+            {'id': 2, 'kind': ENTRY, 'slot_id': 2, 'user_id': 5, 'ref': 0, 'created_at': datetime.utcnow()},
+        ])
+
+    assert log.snapshot() == 1
+
+
+def test_startup_rebuild_matches_database(app):
+    from app import db, event_log
+    from models import ParkingSlot
+
+    with app.app_context():
+        seq, occupancy = event_log.rebuild()
+        statuses = {slot.id: STATUS_CODES[slot.status] for slot in ParkingSlot.query}
+
+    assert seq > 0
+    assert {slot_id: status for slot_id, (status, _) in occupancy.items()} == statuses
+    assert occupancy_counts(occupancy)['Available'] == sum(1 for status in statuses.values() if status == 0)
+
+
+def test_record_timestamps_are_utc_whatever_the_host_zone(app, tmp_path, monkeypatch):
+    from models import GateEvent
+
+    monkeypatch.setenv('TZ', 'Asia/Kolkata')
+    time.tzset()
+    try:
+        engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}")
+        GateEvent.__table__.create(engine)
+        log = EventLog(str(tmp_path / 'log'))
+        with Session(engine) as session:
+            log.init_session(session)
+            log.record(session, ENTRY, slot_id=1, user_id=7)
+            log.record_many(session, EXIT, [(2, 0, 0)])
+            session.commit()
+            now = time.time()
+    finally:
+        monkeypatch.delenv('TZ')
+        time.tzset()
+
+    [segment] = glob.glob(os.path.join(str(tmp_path / 'log'), 'segment-*.log'))
+    with open(segment, 'rb') as f:
+        records = list(RECORD.iter_unpack(f.read()))
+    assert len(records) == 2
+    assert all(abs(record[5] - now) < 5 for record in records)
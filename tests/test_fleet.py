@@ -0,0 +1,84 @@
+import io
+from datetime import datetime, timedelta
+
+import jwt
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import fleet
+from fleet import _Onboarding, onboard_fleet
+from hashing import PasswordHasher
+
+CHEAP_METHOD = 'pbkdf2:sha256:1'
+
+
+def _rows(count, start=0):
+    return [(n + 2, {'name': f'Fleet {n}', 'car_number': f'FL{n:06d}', 'mobile': f'8{n:09d}',
+                     'password': f'fleet-{n}', 'opening_balance': '100'}) for n in range(start, start + count)]
+
+
+def _scratch(app, tmp_path):
+    from app import db
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'fleet.db'}")
+    db.metadata.create_all(engine)
+    return engine
+
+
+def test_onboarding_skips_duplicates(app, tmp_path):
+    from models import User
+
+    engine = _scratch(app, tmp_path)
+    rows = _rows(5) + [(99, dict(_rows(1)[0][1], mobile='7000000000'))]
+    with Session(engine) as session:
+        report = onboard_fleet(session, rows, PasswordHasher(method=CHEAP_METHOD), batch_size=2, max_workers=1)
+        assert session.execute(select(func.count()).select_from(User.__table__)).scalar() == 5
+
+    assert (report['created'], report['credited'], report['rejected']) == (5, 5, 1)
+    assert report['errors'] == [{'line': 99, 'reason': 'Duplicate car number in file'}]
+
+
+def test_second_conflict_rejects_the_batch(app, tmp_path, monkeypatch):
+    engine = _scratch(app, tmp_path)
+
+    def conflicting_insert(self, vehicles, hashes):
+        raise IntegrityError('INSERT INTO user', {}, Exception('UNIQUE constraint failed'))
+
+    # Every insert loses the race, including the retry with the survivors
+    monkeypatch.setattr(_Onboarding, 'insert', conflicting_insert)
+    with Session(engine) as session:
+        report = onboard_fleet(session, _rows(3), PasswordHasher(method=CHEAP_METHOD), max_workers=1)
+
+    assert (report['created'], report['rejected']) == (0, 3)
+    assert {error['reason'] for error in report['errors']} == {'Registered while importing'}
+
+
+def test_dry_run_starts_no_worker_processes(app, tmp_path, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError('process pool started')
+
+    monkeypatch.setattr(fleet, 'ProcessPoolExecutor', no_pool)
+    engine = _scratch(app, tmp_path)
+    with Session(engine) as session:
+        report = onboard_fleet(session, _rows(3), PasswordHasher(method=CHEAP_METHOD), dry_run=True)
+
+    assert (report['valid'], report['created']) == (3, 0)
+
+
+def test_malformed_upload_is_rejected_cleanly(app, client):
+    from models import User
+
+    client.get('/create_admin')
+    with app.app_context():
+        admin_id = User.query.filter_by(car_number='ADMIN001').first().id
+    token = jwt.encode({'user_id': admin_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                       app.secret_key, algorithm='HS256')
+
+    # A field over csv.field_size_limit() makes the reader raise csv.Error
+    upload = b'name,car_number,mobile,password\n"' + b'x' * 200000 + b'",FL000001,8000000001,pw\n'
+    response = client.post('/admin/fleet/onboard', headers={'Authorization': f'Bearer {token}'},
+                           data={'file': (io.BytesIO(upload), 'fleet.csv'), 'dry_run': 'true'})
+
+    assert response.status_code == 200
+    assert not response.json['success']
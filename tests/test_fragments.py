@@ -0,0 +1,29 @@
+from fragments import FragmentCache
+
+
+def test_per_user_fragments_do_not_evict_shared_ones(tmp_path):
+    cache = FragmentCache(str(tmp_path / 'fragments.db'), maxsize=2, user_maxsize=3)
+    builds = []
+
+    def build(name):
+        builds.append(name)
+        return f'<div>{name}</div>'
+
+    cache.render('slot_grid', ['slots'], lambda: build('slot_grid'))
+    for user_id in range(50):
+        cache.render('transactions', [f'wallet:{user_id}'], lambda: build('transactions'))
+
+    assert cache.render('slot_grid', ['slots'], lambda: build('slot_grid')) == '<div>slot_grid</div>'
+    assert builds.count('slot_grid') == 1
+
+    report = cache.report()
+    assert (report['entries'], report['user_entries']) == (1, 3)
+
+
+def test_bump_invalidates_per_user_fragments(tmp_path):
+    cache = FragmentCache(str(tmp_path / 'fragments.db'))
+    versions = iter(['first', 'second'])
+
+    assert cache.render('transactions', ['wallet:1'], lambda: next(versions)) == 'first'
+    cache.bump('wallet:1')
+    assert cache.render('transactions', ['wallet:1'], lambda: next(versions)) == 'second'
@@ -0,0 +1,168 @@
+import time
+import threading
+
+from werkzeug.security import generate_password_hash
+
+import pytest
+
+from hashing import PasswordHasher, HashingBusy
+
+CHEAP_METHOD = 'pbkdf2:sha256:1000'
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.01)
+
+
+def run_in_background(hasher, client, seconds):
+    # A slow job standing in for an expensive hash
+    thread = threading.Thread(target=lambda: _swallow_busy(hasher._run, client, time.sleep, seconds))
+    thread.start()
+    wait_for(lambda: hasher._clients.get(client))
+    return thread
+
+
+def _swallow_busy(fn, *args):
+    try:
+        fn(*args)
+    except HashingBusy:
+        pass
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(method=CHEAP_METHOD, max_workers=1, max_pending=1, per_client_limit=1, timeout=5)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher):
+    password_hash = hasher.hash('secret', client='a')
+    assert password_hash.startswith(CHEAP_METHOD + '$')
+    assert hasher.verify(password_hash, 'secret', client='a')
+    assert not hasher.verify(password_hash, 'wrong', client='a')
+    assert not hasher.needs_rehash(password_hash)
+
+
+def test_saturated_pool_fails_fast(hasher):
+    thread = run_in_background(hasher, 'a', 1.0)
+
+    start = time.perf_counter()
+    with pytest.raises(HashingBusy):
+        hasher.hash('secret', client='b')
+    # Refused at once rather than holding the request worker until a slot frees up
+    assert time.perf_counter() - start < 0.1
+
+    thread.join()
+    assert hasher.verify(hasher.hash('secret', client='b'), 'secret', client='b')
+
+
+def test_per_client_limit():
+    hasher = PasswordHasher(method=CHEAP_METHOD, max_workers=2, max_pending=4, per_client_limit=1, timeout=5)
+    try:
+        thread = run_in_background(hasher, 'a', 1.0)
+        with pytest.raises(HashingBusy):
+            hasher.hash('secret', client='a')
+        assert hasher.hash('secret', client='b')
+        thread.join()
+    finally:
+        hasher.shutdown()
+
+
+def test_timeout_raises_busy_and_keeps_slot_until_job_ends():
+    hasher = PasswordHasher(method=CHEAP_METHOD, max_workers=1, max_pending=1, per_client_limit=1, timeout=0.2)
+    try:
+        hasher.hash('warm up', client='a')
+
+        with pytest.raises(HashingBusy):
+            hasher._run('a', time.sleep, 1.0)
+
+        # The timed-out job is still running, so it still holds the only slot
+        with pytest.raises(HashingBusy):
+            hasher.hash('secret', client='b')
+
+        wait_for(lambda: not hasher._clients)
+        assert hasher.hash('secret', client='b')
+    finally:
+        hasher.shutdown()
+
+
+def test_hash_many_keeps_order(hasher):
+    passwords = [f'password-{n}' for n in range(20)]
+    hashes = hasher.hash_many(passwords)
+    assert [hasher.verify(h, p) for h, p in zip(hashes, passwords)] == [True] * 20
+
+
+def test_login_burst_is_refused_at_once(app, client):
+    from app import password_hasher
+
+    client.get('/create_admin')
+
+    # Fill every hashing slot, as a burst of logins would
+    held = 0
+    while password_hasher._pending.acquire(blocking=False):
+        held += 1
+    try:
+        start = time.perf_counter()
+        response = client.post('/login', data={'car_number': 'ADMIN001', 'password': 'admin123'})
+        assert response.status_code == 429
+        assert time.perf_counter() - start < 0.5
+    finally:
+        for _ in range(held):
+            password_hasher._pending.release()
+
+
+def test_gate_endpoints_stay_fast_under_scrypt_load(app):
+    from app import db, password_hasher
+    from models import User
+
+    with app.app_context():
+        user = User(name='Scrypt', car_number='SCRYPT01', mobile='9000000099',
+                    password_hash=generate_password_hash('right', method='scrypt:32768:8:1'))
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    stop = threading.Event()
+    hashed = []
+
+    def log_in_repeatedly(address):
+        # A wrong password runs a full scrypt verify every time and never rehashes
+        client = app.test_client()
+        client.environ_base['REMOTE_ADDR'] = address
+        while not stop.is_set():
+            response = client.post('/login', data={'car_number': 'SCRYPT01', 'password': 'wrong'})
+            if response.status_code == 200:
+                hashed.append(address)
+
+    gate = app.test_client()
+    gate.get('/api/status')
+    threads = [threading.Thread(target=log_in_repeatedly, args=(f'10.0.0.{n}',))
+               for n in range(password_hasher.max_workers)]
+    try:
+        for thread in threads:
+            thread.start()
+        wait_for(lambda: len(hashed) >= len(threads))
+
+        latencies = []
+        for _ in range(50):
+            start = time.perf_counter()
+            assert gate.get('/api/status').status_code == 200
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.01)
+        hashed_during = len(hashed)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        with app.app_context():
+            User.query.filter_by(id=user_id).delete()
+            db.session.commit()
+
+    # Logins kept hashing throughout, and the gate endpoint never queued behind them
+    assert hashed_during > len(threads)
+    latencies.sort()
+    assert latencies[int(len(latencies) * 0.95)] < 0.1
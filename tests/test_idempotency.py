@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+
+from idempotency import REPLAY
+
+
+@pytest.fixture
+def wallet_user(app):
+    from app import db
+    from models import User
+
+    with app.app_context():
+        user = User(name='Idempotent', car_number='IDEM0001', mobile='9000000001', password_hash='x', wallet_balance=0)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    token = jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                       app.secret_key, algorithm='HS256')
+    yield user_id, {'Authorization': f'Bearer {token}'}
+
+    with app.app_context():
+        from models import Transaction
+        Transaction.query.filter_by(user_id=user_id).delete()
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+
+
+def _balance(app, user_id):
+    from app import db
+    from models import User
+
+    with app.app_context():
+        return db.session.get(User, user_id).wallet_balance
+
+
+def test_failure_after_commit_is_not_executed_again(app, client, wallet_user, monkeypatch):
+    import app as app_module
+
+    user_id, headers = wallet_user
+    headers = {**headers, 'Idempotency-Key': 'top-up-1'}
+
+    def broken_bump(*scopes):
+        raise RuntimeError('version store unavailable')
+
+    monkeypatch.setattr(app_module.fragment_cache, 'bump', broken_bump)
+    first = client.post('/add_funds', data={'amount': '100'}, headers=headers)
+    monkeypatch.undo()
+
+    retry = client.post('/add_funds', data={'amount': '100'}, headers=headers)
+
+    assert first.status_code == 500
+    assert retry.headers.get('Idempotent-Replayed') == 'true'
+    assert _balance(app, user_id) == 100
+
+
+def test_failure_before_commit_releases_the_key(app, client, wallet_user, monkeypatch):
+    from app import db
+
+    user_id, headers = wallet_user
+    headers = {**headers, 'Idempotency-Key': 'top-up-2'}
+
+    def broken_commit():
+        raise RuntimeError('database unavailable')
+
+    monkeypatch.setattr(db.session, 'commit', broken_commit)
+    with pytest.raises(RuntimeError):
+        client.post('/add_funds', data={'amount': '50'}, headers=headers)
+    monkeypatch.undo()
+
+    retry = client.post('/add_funds', data={'amount': '50'}, headers=headers)
+
+    assert retry.status_code == 302
+    assert 'Idempotent-Replayed' not in retry.headers
+    assert _balance(app, user_id) == 50
+
+
+def test_bump_failure_does_not_fail_the_request(tmp_path):
+    from fragments import FragmentCache
+
+    cache = FragmentCache(str(tmp_path / 'missing' / 'fragments.db'))
+    cache.bump('slots')
+
+
+def test_worker_death_after_commit_still_replays(app, client, wallet_user, monkeypatch):
+    import app as app_module
+
+    user_id, headers = wallet_user
+    headers = {**headers, 'Idempotency-Key': 'top-up-3'}
+
+    # The worker is killed after the route commits but before the response is stored
+    monkeypatch.setattr(app_module.idempotency_store, 'complete', lambda *args, **kwargs: None)
+    client.post('/add_funds', data={'amount': '70'}, headers=headers)
+    monkeypatch.undo()
+
+    # Even once the lease has run out, the key is not handed to a retry
+    store = app_module.idempotency_store
+    key = store.key_for(user_id, 'add_funds', 'top-up-3')
+    with app.app_context():
+        state, _ = store.begin(app_module.db.engine, key, store.fingerprint('/add_funds', [('amount', '70')]),
+                               now=datetime.utcnow() + store.lease * 2)
+    assert state == REPLAY
+
+    retry = client.post('/add_funds', data={'amount': '70'}, headers=headers)
+    assert retry.headers.get('Idempotent-Replayed') == 'true'
+    assert retry.json['message'] == 'This request was already processed.'
+    assert _balance(app, user_id) == 70
+
+
+def test_taken_over_claim_cannot_commit_or_release(app):
+    from app import db
+    from idempotency import CLAIMED, ClaimLost, IdempotencyStore
+    from flask import jsonify
+
+    store = IdempotencyStore(lease=timedelta(seconds=30))
+    now = datetime.utcnow()
+    with app.test_request_context():
+        state, first = store.begin(db.engine, 'takeover-key', 'fp', now=now)
+        assert state == CLAIMED
+        # The first worker stalls past its lease and a retry takes the key over
+        state, second = store.begin(db.engine, 'takeover-key', 'fp', now=now + timedelta(minutes=1))
+        assert state == CLAIMED
+
+        with pytest.raises(ClaimLost):
+            store.mark_done(db.session, 'takeover-key', first, jsonify({'success': True}))
+        db.session.rollback()
+
+        store.release(db.engine, 'takeover-key', first)
+        assert store.begin(db.engine, 'takeover-key', 'fp', now=now + timedelta(minutes=1))[0] != CLAIMED
+
+        store.release(db.engine, 'takeover-key', second)
+        assert store.begin(db.engine, 'takeover-key', 'fp', now=now + timedelta(minutes=1))[0] == CLAIMED
+        store.sweep(db.engine, now=now + timedelta(days=2))
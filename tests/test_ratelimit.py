@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import jwt
+
+from ratelimit import RateLimiter
+
+
+def _limiter(tmp_path):
+    return RateLimiter(str(tmp_path / 'ratelimit.db'), limits={'qr': (2, 2 / 60), 'qr_ip': (5, 5 / 60)})
+
+
+def test_denied_user_does_not_drain_shared_address(tmp_path):
+    limiter = _limiter(tmp_path)
+
+    assert [limiter.hit(('qr', 'user:1'), ('qr_ip', 'ip:nat')) == 0 for _ in range(6)] == [True, True] + [False] * 4
+
+    # Only the two allowed requests were charged to the address
+    assert limiter.hit(('qr', 'user:2'), ('qr_ip', 'ip:nat')) == 0
+    assert limiter.hit(('qr', 'user:3'), ('qr_ip', 'ip:nat')) == 0
+    assert limiter.hit(('qr', 'user:3'), ('qr_ip', 'ip:nat')) == 0
+
+
+def test_address_limit_caps_many_users(tmp_path):
+    limiter = _limiter(tmp_path)
+
+    allowed = [limiter.hit(('qr', f'user:{n}'), ('qr_ip', 'ip:nat')) == 0 for n in range(7)]
+    assert allowed == [True] * 5 + [False] * 2
+    assert limiter.hit(('qr', 'user:9'), ('qr_ip', 'ip:other')) == 0
+
+
+def test_one_user_at_a_gate_does_not_lock_out_the_next(app, client):
+    from app import db
+    from models import User
+
+    with app.app_context():
+        users = [User(name=f'Gate {n}', car_number=f'NAT{n:05d}', mobile=f'910000000{n}', password_hash='x')
+                 for n in range(2)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+
+    def headers(user_id):
+        token = jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                           app.secret_key, algorithm='HS256')
+        return {'Authorization': f'Bearer {token}'}
+
+    try:
+        statuses = [client.post('/generate_exit_qr', headers=headers(user_ids[0]),
+                                environ_base={'REMOTE_ADDR': '100.64.0.1'}).status_code for _ in range(12)]
+        assert statuses.count(429) == 2
+
+        response = client.post('/generate_exit_qr', headers=headers(user_ids[1]),
+                               environ_base={'REMOTE_ADDR': '100.64.0.1'})
+        assert response.status_code != 429
+    finally:
+        with app.app_context():
+            User.query.filter(User.id.in_(user_ids)).delete()
+            db.session.commit()
@@ -0,0 +1,78 @@
+import threading
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from werkzeug.serving import make_server
+from werkzeug.test import Client
+
+from capture import TrafficCapture
+from replay import ReplayUser, build_request, load_capture, load_results, replay_address
+
+
+@pytest.fixture
+def bill(app):
+    from app import db
+    from models import Bill
+
+    with app.app_context():
+        db.session.add(Bill(barcode='REPLAY0001', bill_number='BILLR001', amount=750, status='Active'))
+        db.session.commit()
+    yield 'REPLAY0001'
+    with app.app_context():
+        Bill.query.filter_by(barcode='REPLAY0001').delete()
+        db.session.commit()
+
+
+@pytest.fixture
+def server(app):
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+def test_multipart_bill_scan_survives_capture_and_replay(app, client, bill, server, tmp_path):
+    client.get('/create_admin')
+    with app.app_context():
+        from models import User
+        admin_id = User.query.filter_by(car_number='ADMIN001').first().id
+    token = jwt.encode({'user_id': admin_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                       app.secret_key, algorithm='HS256')
+
+    # The bill scanner posts FormData, i.e. multipart/form-data
+    capture = TrafficCapture(app.wsgi_app, app.url_map, str(tmp_path), 'salt')
+    original = Client(capture).post('/bill/verify_bill', data={'barcode': bill},
+                                    headers={'Authorization': f'Bearer {token}'}, content_type='multipart/form-data')
+    assert original.json['success']
+    original.close()
+
+    [record] = load_capture(str(tmp_path))
+    assert record['p'] == {'barcode': bill}
+
+    user = ReplayUser(server, record['u'])
+    user.setup()
+    status, body = user.send(*build_request(record, user, 1))
+    assert status == 200
+    assert body == original.data
+
+
+def test_replay_users_send_from_distinct_addresses():
+    users = [ReplayUser('http://localhost', f'{n:012x}') for n in range(1000)]
+    assert len({user.address for user in users}) == 1000
+    assert replay_address(5) == replay_address(5)
+
+
+def test_compare_keeps_rejections_apart(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    path.write_text('\n'.join([
+        '{"m":"POST","r":"/generate_exit_qr","s":200,"d":40.0,"lag":0}',
+        '{"m":"POST","r":"/generate_exit_qr","s":429,"d":1.0,"lag":0}',
+        '{"m":"POST","r":"/generate_exit_qr","s":302,"d":30.0,"lag":0}',
+    ]) + '\n')
+
+    results = load_results(str(path))
+    assert results[('POST /generate_exit_qr', '2xx')] == [40.0]
+    assert results[('POST /generate_exit_qr', '429')] == [1.0]
+    assert results[('POST /generate_exit_qr', '3xx')] == [30.0]
@@ -0,0 +1,175 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from reservations import ReservationIndex, _GapTree, book_slot, parse_utc
+
+
+def login(client, car_number, mobile):
+    client.post('/register', data={'name': 'Res', 'car_number': car_number, 'mobile': mobile, 'password': 'pw123456'})
+    assert client.post('/login', data={'car_number': car_number, 'password': 'pw123456'}).status_code == 302
+
+
+def test_parse_utc_normalises_offsets():
+    assert parse_utc('2030-01-01T10:00:00Z') == datetime(2030, 1, 1, 10, 0)
+    assert parse_utc('2030-01-01T15:30:00+05:30') == datetime(2030, 1, 1, 10, 0)
+    assert parse_utc('2030-01-01T10:00:00') == datetime(2030, 1, 1, 10, 0)
+    with pytest.raises(ValueError):
+        parse_utc(None)
+
+
+def test_booking_with_offset_timestamps(client):
+    login(client, 'RES0001', '5000000001')
+    start = (datetime.utcnow() + timedelta(days=1)).replace(microsecond=0)
+    response = client.post('/reservations', data={'start': start.isoformat() + 'Z',
+                                                  'end': (start + timedelta(hours=1)).isoformat() + '+00:00'})
+    assert response.status_code == 200
+    assert response.json['success']
+
+
+def test_sync_picks_up_bookings_from_other_workers(app, client):
+    from app import db
+    from models import ParkingSlot, Reservation, User
+
+    login(client, 'RES0002', '5000000002')
+    start = (datetime.utcnow() + timedelta(days=2)).replace(microsecond=0)
+    end = start + timedelta(hours=1)
+
+    with app.app_context():
+        user_id = User.query.filter_by(car_number='RES0002').first().id
+        slot_ids = [slot.id for slot in ParkingSlot.query.filter(ParkingSlot.status != 'Maintenance')]
+
+        def booking(slot_id, created_at):
+            return Reservation(user_id=user_id, slot_id=slot_id, start_at=start, end_at=end,
+                               status='Booked', created_at=created_at)
+
+        seed = booking(slot_ids[0], datetime.utcnow())
+        db.session.add(seed)
+        db.session.commit()
+        index = ReservationIndex()
+        index.sync(db.session)
+
+        # Another worker's booking gets a lower id and an earlier created_at
+        # than one this worker makes and adds to its own index
+        other = booking(slot_ids[1], seed.created_at - timedelta(seconds=5))
+        db.session.add(other)
+        db.session.commit()
+        mine = booking(slot_ids[2], datetime.utcnow())
+        db.session.add(mine)
+        db.session.commit()
+        index.add(mine)
+
+        assert index.is_free(slot_ids[1], start, end)
+        index.sync(db.session)
+        assert not index.is_free(slot_ids[1], start, end)
+        assert not index.is_free(slot_ids[2], start, end)
+
+        for reservation in (seed, other, mine):
+            db.session.delete(reservation)
+        db.session.commit()
+
+
+def test_find_free_slot_when_every_slot_has_bookings(app):
+    from app import db
+
+    with app.app_context():
+        index = ReservationIndex()
+        index.sync(db.session)
+        start = datetime.utcnow() + timedelta(days=3)
+        end = start + timedelta(hours=1)
+
+        # Fill every slot for the window: nothing is free
+        for n, slot_id in enumerate(sorted(index._bookable)):
+            index._add(slot_id, start, end, -(n + 1))
+        assert index.find_free_slot(start, end) is None
+        # A later window is free on every slot
+        assert index.find_free_slot(end, end + timedelta(hours=1)) in index._bookable
+
+
+def test_gap_tree_matches_a_scan_of_every_slot():
+    rng = random.Random(7)
+    base = datetime(2030, 1, 1)
+    bookings = {slot_id: [] for slot_id in range(200)}
+    index = ReservationIndex()
+    index._bookable = set(bookings)
+    for slot_id in bookings:
+        index._index_gaps(slot_id)
+
+    next_id = 1
+    for _ in range(2000):
+        slot_id = rng.randrange(200)
+        start = base + timedelta(minutes=rng.randrange(0, 10000, 15))
+        end = start + timedelta(minutes=rng.randrange(15, 600, 15))
+        if index.is_free(slot_id, start, end):
+            index._add(slot_id, start, end, next_id)
+            bookings[slot_id].append((start, end))
+            next_id += 1
+
+    for _ in range(500):
+        start = base + timedelta(minutes=rng.randrange(0, 10000, 15))
+        end = start + timedelta(minutes=rng.randrange(15, 600, 15))
+        free = {slot_id for slot_id, taken in bookings.items() if all(e <= start or s >= end for s, e in taken)}
+        found = index.find_free_slot(start, end)
+        assert (found in free) if free else found is None
+
+
+def test_gap_tree_delete_restores_the_gap():
+    tree = _GapTree()
+    tree.insert(datetime.min, 1, datetime(2030, 1, 1, 10))
+    tree.insert(datetime(2030, 1, 1, 11), 1, datetime.max)
+    assert tree.find(datetime(2030, 1, 1, 10), datetime(2030, 1, 1, 11)) is None
+    tree.delete(datetime(2030, 1, 1, 11), 1)
+    tree.delete(datetime.min, 1)
+    tree.insert(datetime.min, 1, datetime.max)
+    assert tree.find(datetime(2030, 1, 1, 10), datetime(2030, 1, 1, 11)) == 1
+
+
+def test_workers_with_stale_indexes_cannot_double_book(app, client):
+    from app import db
+    from models import Reservation, User
+
+    login(client, 'RES0003', '5000000003')
+    start = (datetime.utcnow() + timedelta(days=4)).replace(microsecond=0)
+    end = start + timedelta(hours=1)
+
+    with app.app_context():
+        user_id = User.query.filter_by(car_number='RES0003').first().id
+
+    # Two workers whose indexes both believe only one slot is left
+    indexes = []
+    with app.app_context():
+        for _ in range(2):
+            index = ReservationIndex()
+            index.sync(db.session)
+            for n, slot_id in enumerate(sorted(index._bookable)[1:]):
+                index._add(slot_id, start, end, -(n + 1))
+            indexes.append(index)
+
+    barrier = threading.Barrier(2)
+    outcomes = []
+
+    def book(index):
+        with app.app_context():
+            barrier.wait()
+            try:
+                outcomes.append(book_slot(db.session, index, user_id, start, end).slot_id)
+            except ValueError as e:
+                outcomes.append(str(e))
+
+    threads = [threading.Thread(target=book, args=(index,)) for index in indexes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        booked = Reservation.query.filter_by(user_id=user_id).all()
+        slot_ids = [reservation.slot_id for reservation in booked]
+        for reservation in booked:
+            db.session.delete(reservation)
+        db.session.commit()
+
+    assert len(slot_ids) == 1
+    assert sorted(outcomes, key=str) == sorted([slot_ids[0], 'No parking slots available for the requested time.'], key=str)
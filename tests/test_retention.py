@@ -0,0 +1,77 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select
+
+import storage
+from retention import run_retention
+
+
+def test_maintenance_engine_drops_request_timeouts():
+    # The project's driver is psycopg2; name it, since newer SQLAlchemy defaults to psycopg 3
+    pytest.importorskip('psycopg2')
+    engine = storage.maintenance_engine('postgresql+psycopg2://localhost/parkease', 'postgresql')
+    options = engine.dialect.create_connect_args(engine.url)[1]['options']
+    engine.dispose()
+
+    assert '-c statement_timeout=0' in options
+    assert '-c idle_in_transaction_session_timeout=0' in options
+    assert f"-c lock_timeout={storage.STORAGE_PROFILES['postgresql']['lock_timeout_ms']}" in options
+
+
+def test_archive_runs_on_the_given_engine(app, tmp_path):
+    from app import db
+    from models import Transaction, TransactionArchive, User
+
+    engine = storage.maintenance_engine(f"sqlite:///{tmp_path / 'maintenance.db'}", 'sqlite')
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__).values(id=1, name='Old', car_number='OLD1', mobile='0000000001',
+                                                   password_hash='x'))
+        conn.execute(insert(Transaction.__table__), [
+            {'user_id': 1, 'amount': 10, 'type': 'credit', 'timestamp': now - timedelta(days=400)},
+            {'user_id': 1, 'amount': 20, 'type': 'credit', 'timestamp': now},
+        ])
+
+    report = run_retention(db, policy={'compact': True}, now=now, engine=engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Transaction.__table__)).scalar() == 1
+        assert conn.execute(select(func.count()).select_from(TransactionArchive.__table__)).scalar() == 1
+    engine.dispose()
+    assert report['transaction']['rows'] == 1
+
+
+def test_file_mode_reports_moved_and_reclaimed_bytes(app, tmp_path):
+    from app import db
+    from models import Transaction, User
+
+    engine = storage.maintenance_engine(f"sqlite:///{tmp_path / 'maintenance.db'}", 'sqlite')
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__).values(id=1, name='Old', car_number='OLD1', mobile='0000000001',
+                                                   password_hash='x'))
+        conn.execute(insert(Transaction.__table__), [
+            {'user_id': 1, 'amount': n, 'type': 'credit', 'description': 'x' * 200,
+             'timestamp': now - timedelta(days=400)}
+            for n in range(2000)
+        ])
+
+    archive_dir = tmp_path / 'archive'
+    report = run_retention(db, policy={'mode': 'file', 'archive_dir': str(archive_dir), 'compact': True},
+                           now=now, engine=engine)
+    engine.dispose()
+
+    [archive] = archive_dir.glob('transaction-*.jsonl.gz')
+    with gzip.open(archive, 'rt', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 2000
+    assert json.loads(lines[0])['description'] == 'x' * 200
+
+    assert report['payload_bytes_moved'] == sum(len(line) for line in lines)
+    assert report['bytes_reclaimed'] == report['db_bytes_before'] - report['db_bytes_after']
+    assert 0 < report['bytes_reclaimed'] < report['db_bytes_before']
@@ -0,0 +1,40 @@
+from sqlalchemy import create_engine, inspect, text
+
+import storage
+
+
+def test_sqlite_profile_sets_pragmas_on_every_connection(tmp_path):
+    url = f"sqlite:///{tmp_path / 'storage.db'}"
+    engine = create_engine(url, **storage.engine_options('sqlite'))
+    storage.configure_engine(engine, 'sqlite')
+
+    with engine.connect() as conn:
+        pragmas = {name: conn.execute(text(f'PRAGMA {name}')).scalar()
+                   for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'temp_store')}
+    engine.dispose()
+
+    # synchronous NORMAL is 1, temp_store MEMORY is 2
+    assert pragmas == {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000,
+                       'cache_size': -20000, 'temp_store': 2}
+
+
+def test_legacy_profile_leaves_sqlite_defaults(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}", **storage.engine_options('legacy'))
+    storage.configure_engine(engine, 'legacy')
+
+    with engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'delete'
+    engine.dispose()
+
+
+def test_hot_query_indexes_exist(app):
+    from app import db
+
+    with app.app_context():
+        inspector = inspect(db.engine)
+        indexes = {table: {index['name'] for index in inspector.get_indexes(table)}
+                   for table in ('parking_slot', 'transaction', 'qr_code')}
+
+    assert 'ix_parking_slot_status' in indexes['parking_slot']
+    assert 'ix_transaction_user_time' in indexes['transaction']
+    assert {'ix_qr_code_session', 'ix_qr_code_created'} <= indexes['qr_code']
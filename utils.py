@@ -4,6 +4,7 @@ import base64
 import json
 from datetime import datetime, timedelta
 import secrets
+import sqlite3
 
 def generate_qr_code(data):
     """
@@ -71,3 +72,22 @@ def is_valid_bill_amount(amount):
         bool: True if amount qualifies for free exit, False otherwise
     """
     return amount >= 500
+
+def connect_local_state(path, schema):
+    """
+    Open a SQLite file holding small pieces of state shared by every
+    worker process on this host (rate limit buckets, cache versions)
+    
+    Args:
+        path (str): SQLite file path
+        schema (str): CREATE TABLE IF NOT EXISTS statement for the state table
+    
+    Returns:
+        sqlite3.Connection: Autocommit connection
+    """
+    conn = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # Losing a little state on power loss is fine, an fsync per write is not
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute(schema)
+    return conn